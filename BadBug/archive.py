@@ -1,54 +1,13 @@
+import sys
+sys.path.append('..')
 import discord
 from discord.ext import commands
-import json
 import os
 from secret_bot import TOKEN
+from local_db import LocalCollection
+from rest_scheduler import submit, PRIORITY_INTERACTIVE
 
 # --- 1. DATABASE HANDLER ---
-DB_FILE = "database.json"
-
-class LocalCollection:
-    def __init__(self, name):
-        self.name = name
-
-    def _load_all(self):
-        try:
-            with open(DB_FILE, "r") as f:
-                return json.load(f)
-        except: return {}
-
-    def _save_all(self, data):
-        with open(DB_FILE, "w") as f:
-            json.dump(data, f, indent=4, default=str)
-
-    async def find_one(self, query):
-        all_data = self._load_all()
-        collection = all_data.get(self.name, [])
-        for doc in collection:
-            if all(doc.get(k) == v for k, v in query.items()):
-                return doc
-        return None
-
-    async def update_one(self, query, update, upsert=False):
-        all_data = self._load_all()
-        if self.name not in all_data: all_data[self.name] = []
-        
-        found = False
-        for doc in all_data[self.name]:
-            if all(doc.get(k) == v for k, v in query.items()):
-                if "$set" in update:
-                    doc.update(update["$set"])
-                found = True
-                break
-        
-        if not found and upsert:
-            new_doc = query.copy()
-            if "$set" in update:
-                new_doc.update(update["$set"])
-            all_data[self.name].append(new_doc)
-
-        self._save_all(all_data)
-
 config_col = LocalCollection("badbug_config")
 
 # --- 2. BOT SETUP ---
@@ -181,8 +140,7 @@ async def on_raw_reaction_add(payload):
         
         channel = bot.get_channel(payload.channel_id)
         try:
-            msg = await channel.fetch_message(payload.message_id)
-            await msg.remove_reaction(payload.emoji, payload.member)
+            await submit(lambda: channel.get_partial_message(payload.message_id).remove_reaction(payload.emoji, payload.member), PRIORITY_INTERACTIVE, route=("reactions", channel.id))
         except: pass
 
         overwrites = {
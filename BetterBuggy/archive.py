@@ -1,10 +1,12 @@
 import discord
 from discord.ext import commands
-import json
 import os
 import re
 import asyncio
 import sys
+sys.path.append('..')
+from local_db import LocalCollection
+from rest_scheduler import submit, PRIORITY_INTERACTIVE
 
 # Try to import the token from secret_bot.py in the same folder
 try:
@@ -14,7 +16,7 @@ except ImportError:
     sys.exit()
 
 # --- FUNCTION LIST ---
-# 1. LocalCollection Class: Handles database.json interactions.
+# 1. Collections: Shared LocalCollection (local_db.py) over database.json.
 # 2. Config & DB Setup: Loads settings and active tasks.
 # 3. TaskView Class: The UI for the progress bar (Buttons & Logic).
 # 4. Helper: get_emoji_bar(state): Creates the 30x2 grid using consistent square emojis.
@@ -26,70 +28,9 @@ except ImportError:
 # 10. Command: settings(): Shows current config.
 
 # --- 1. DATABASE HANDLER ---
-DB_FILE = "database.json"
-
-class LocalCollection:
-    def __init__(self, name):
-        self.name = name
-
-    def _load_all(self):
-        try:
-            with open(DB_FILE, "r") as f:
-                return json.load(f)
-        except: return {}
-
-    def _save_all(self, data):
-        with open(DB_FILE, "w") as f:
-            json.dump(data, f, indent=4, default=str)
-
-    async def find_one(self, query):
-        all_data = self._load_all()
-        collection = all_data.get(self.name, [])
-        for doc in collection:
-            if all(doc.get(k) == v for k, v in query.items()):
-                return doc
-        return None
-
-    async def find_all(self):
-        all_data = self._load_all()
-        return all_data.get(self.name, [])
-
-    async def insert_one(self, doc):
-        all_data = self._load_all()
-        if self.name not in all_data: all_data[self.name] = []
-        all_data[self.name].append(doc)
-        self._save_all(all_data)
-
-    async def delete_one(self, query):
-        all_data = self._load_all()
-        collection = all_data.get(self.name, [])
-        new_collection = [doc for doc in collection if not all(doc.get(k) == v for k, v in query.items())]
-        all_data[self.name] = new_collection
-        self._save_all(all_data)
-
-    async def update_one(self, query, update, upsert=False):
-        all_data = self._load_all()
-        if self.name not in all_data: all_data[self.name] = []
-        
-        found = False
-        for doc in all_data[self.name]:
-            if all(doc.get(k) == v for k, v in query.items()):
-                if "$set" in update:
-                    doc.update(update["$set"])
-                found = True
-                break
-        
-        if not found and upsert:
-            new_doc = query.copy()
-            if "$set" in update:
-                new_doc.update(update["$set"])
-            all_data[self.name].append(new_doc)
-
-        self._save_all(all_data)
-
 # Collections
 config_col = LocalCollection("betterbuggy_config")
-tasks_col = LocalCollection("betterbuggy_tasks")
+tasks_col = LocalCollection("betterbuggy_tasks", indexes=["user_id", "message_id"])
 
 # --- 2. CONFIG & SETUP ---
 intents = discord.Intents.default()
@@ -370,7 +311,7 @@ async def on_message(message):
                         try:
                             channel = bot.get_channel(channel_id)
                             if channel:
-                                await channel.fetch_message(msg_id)
+                                await submit(lambda: channel.fetch_message(msg_id), PRIORITY_INTERACTIVE, route=("fetch", channel.id))
                                 message_exists = True
                         except discord.NotFound:
                             pass # Message deleted
@@ -426,8 +367,8 @@ async def handle_sleep_command(message, target_member):
 
     try:
         await target_member.move_to(sleep_channel)
-        await message.add_reaction("💤")
-        await message.add_reaction("🛌")
+        await submit(lambda: message.add_reaction("💤"), PRIORITY_INTERACTIVE, route=("reactions", message.channel.id))
+        await submit(lambda: message.add_reaction("🛌"), PRIORITY_INTERACTIVE, route=("reactions", message.channel.id))
     except discord.Forbidden:
         await message.channel.send("❌ I don't have permission to move members, buggy!")
     except Exception as e:
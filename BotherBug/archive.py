@@ -7,105 +7,16 @@ import io
 import asyncio
 from datetime import datetime
 from discord.ext import commands
-import json
 import os
+from local_db import LocalCollection
+from rest_scheduler import submit, PRIORITY_INTERACTIVE
 
 # --- CONFIGURATION ---
 ADMIN_USER_ID = 1433003746719170560
 
-# --- DATABASE SETUP ---
-DB_FILE = "database.json"
-
-class AsyncIterator:
-    def __init__(self, items):
-        self.items = items
-    def __aiter__(self):
-        self.idx = 0
-        return self
-    async def __anext__(self):
-        if self.idx >= len(self.items): raise StopAsyncIteration
-        item = self.items[self.idx]
-        self.idx += 1
-        return item
-    
-    # --- FIX: Kept this to prevent crashes when looking up images ---
-    async def to_list(self, length=None):
-        return self.items
-
-class LocalCollection:
-    def __init__(self, name):
-        self.name = name
-
-    def _load_all(self):
-        try:
-            with open(DB_FILE, "r") as f:
-                return json.load(f)
-        except: return {}
-
-    def _save_all(self, data):
-        with open(DB_FILE, "w") as f:
-            json.dump(data, f, indent=4, default=str)
-
-    async def find_one(self, query):
-        all_data = self._load_all()
-        collection = all_data.get(self.name, [])
-        for doc in collection:
-            if all(doc.get(k) == v for k, v in query.items()):
-                return doc
-        return None
-
-    def find(self, query={}):
-        all_data = self._load_all()
-        collection = all_data.get(self.name, [])
-        results = [doc for doc in collection if all(doc.get(k) == v for k, v in query.items())]
-        return AsyncIterator(results)
-
-    async def insert_one(self, doc):
-        all_data = self._load_all()
-        if self.name not in all_data: all_data[self.name] = []
-        all_data[self.name].append(doc)
-        self._save_all(all_data)
-
-    async def delete_one(self, query):
-        all_data = self._load_all()
-        collection = all_data.get(self.name, [])
-        new_collection = [doc for doc in collection if not all(doc.get(k) == v for k, v in query.items())]
-        all_data[self.name] = new_collection
-        self._save_all(all_data)
-        
-    async def replace_one(self, query, doc, upsert=False):
-        await self.delete_one(query)
-        await self.insert_one(doc)
-
-    async def update_one(self, query, update, upsert=False):
-        all_data = self._load_all()
-        if self.name not in all_data: all_data[self.name] = []
-        
-        collection = all_data[self.name]
-        found = False
-        
-        for doc in collection:
-            if all(doc.get(k) == v for k, v in query.items()):
-                if "$set" in update:
-                    doc.update(update["$set"])
-                found = True
-                break
-        
-        # If not found and upsert is True, create it!
-        if not found and upsert:
-            new_doc = query.copy()
-            if "$set" in update:
-                new_doc.update(update["$set"])
-            collection.append(new_doc)
-            found = True
-        
-        if found:
-            self._save_all(all_data)
-        return found
-
 # --- COLLECTIONS ---
 settings_col = LocalCollection("settings")
-images_col = LocalCollection("images")
+images_col = LocalCollection("images", indexes=["guild_id"])
 
 # --- MEMORY (CACHE) ---
 settings_cache = {}
@@ -489,7 +400,7 @@ async def on_message(message):
     if settings.get("react_target_id") == message.author.id:
         if settings.get("reaction"):
             try:
-                await message.add_reaction(settings["reaction"])
+                await submit(lambda: message.add_reaction(settings["reaction"]), PRIORITY_INTERACTIVE, route=("reactions", message.channel.id))
             except:
                 pass 
 
@@ -9,17 +9,23 @@
 - load_youtube_service(): Connects to YouTube API.
 - load_music_services(): Connects to Spotify and YouTube Music.
 - process_spotify_link(url): (ASYNC) Processes Spotify link.
-- send_log(text): Sends a message to the log channel.
+- send_log(text): Queues a line for the log channel (sent in batches by LogSink).
 - check_manager_logs(): Loop that checks for logs from other processes (IPC).
 - nightly_purge(): task that deletes messages in specific channels at 3 AM.
+- purge_channel(channel, limit, check, priority): channel.purge, but every history page and delete batch is its own scheduler call.
 - check_token_validity_task(): Daily task to verify YouTube license and Music tokens.
-- task_loop(): (New) Robust minute-by-minute timer for nightly tasks AND lockout checks.
+- task_loop(): (New) Robust minute-by-minute timer for nightly tasks.
+- schedule_lockout(user_id, data) / rebuild_lockout_schedule(): Plans each user's next lock/unlock time.
+- lockout_worker(): Sleeps until the next lockout transition is due, then applies it (apply_lockout).
+- release_from_jail(user_id) / sync_jail() / save_jail_timeouts(): Jail timer callbacks (sentence served, state changed) and VC reconciliation on startup.
 - handle_sleep_command(message, target_member): Moves users to Sleep VC.
-- is_time_in_range(start, end, current): Helper for lockout time checking.
+- track_sticky_message / untrack_sticky_messages / last_sticky_channel_author: Sticky channels' recent messages from gateway events.
+- poke_sticky(channel) / sticky_worker(channel): A message after sticky_delay_seconds starts one repost worker per channel (bursts -> one repost).
 
 --- DATABASE HANDLER ---
 - load_config(): Gets bot config from JSON.
 - save_config(config_data): Saves bot config to JSON.
+- load_jail_timeouts() / save_jail_timeouts(timeouts): Jail sentences, kept in their own doc so jail changes don't rewrite the config.
 - load_stickies(): Loads active sticky messages.
 - save_sticky(...): Saves a new sticky message.
 - delete_sticky(channel_id): Removes a sticky message.
@@ -32,6 +38,10 @@
 - save_user_lockout(user_id, data): Saves lockout data.
 - delete_user_lockout(user_id): Deletes lockout data.
 
+--- LOG SINK ---
+- LogSink: Bounded queue of log lines, packed into as few messages as possible (<2000 chars each),
+  flushed when a message fills up or after LOG_FLUSH_SECONDS. Overflow is counted and summarised.
+
 --- UI CLASSES ---
 - TaskView: Handles the Buttons (Done, Skip, Undo) for Task Lists.
 
@@ -48,6 +58,7 @@
 - /stick <text>: Creates a sticky message in the current channel.
 - /unstick: Removes the sticky message in the current channel.
 - /liststickies: Lists all active sticky messages.
+- /reststats: (Admin) Shows REST scheduler queue delays per priority.
 - /vote <user>: (Admin) Registers a vote against a user.
 - /removevotes <user>: (Admin) Removes the most recent vote.
 - /showvotes: (Admin) Lists all active votes.
@@ -76,8 +87,9 @@
 - on_ready: Startup sequence.
 - on_raw_reaction_add: Handles ticket access, DM Request Logic, and Manual Role Removal.
 - on_member_update: Handles auto-bans and ticket role assignment.
-- on_voice_state_update: Handles jail logic (MamaBug).
+- on_voice_state_update: Starts/stops jail timers on jail VC joins and leaves (MamaBug).
 - on_message: Handles Sticky, Music, Media Only, and DM Request logic.
+- on_raw_message_delete / on_raw_bulk_message_delete: Keep the sticky channels' recent-message tracking current.
 """
 
 import sys
@@ -100,6 +112,7 @@ from google.auth.transport.requests import Request
 from google_auth_oauthlib.flow import Flow
 import datetime
 import asyncio
+import bisect
 import os
 import json
 import re
@@ -108,11 +121,18 @@ import requests
 from ytmusicapi import YTMusic
 from spotipy import Spotify
 from spotipy.oauth2 import SpotifyClientCredentials
+from local_db import Journal
+from rest_scheduler import submit, format_stats, PRIORITY_MODERATION, PRIORITY_INTERACTIVE, PRIORITY_LOG, PRIORITY_BACKGROUND
+from lockout_schedule import LockoutSchedule, is_locked_at
+from jail_timers import JailTimers
 
 # --- CONFIGURATION ---
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_NAME = "BuggyBotDB"
 IPC_FILE = os.path.join(BASE_DIR, "pending_logs.json")
+LOG_FLUSH_SECONDS = 2     # Wait this long for more log lines before sending
+LOG_QUEUE_LIMIT = 200     # Lines kept waiting at most; the rest are counted and summarised
+LOG_MESSAGE_LIMIT = 2000  # Discord's message length limit
 
 DEFAULT_CONFIG = {
     "log_channel_id": 0,
@@ -191,6 +211,12 @@ ROLE_ID_KEYS = ["bad_role_to_ban_id", "ticket_access_role_id", "lockout_target_r
 config = DEFAULT_CONFIG.copy()
 db = None
 sticky_data = {} 
+# Recent messages in sticky channels from gateway events: {channel_id: [(message_id, author_id), ...]}, oldest first.
+# Keeping a few means a deleted last message still leaves us knowing the one before it.
+sticky_recent = {}
+STICKY_TRACK_DEPTH = 20
+sticky_workers = {}  # {channel_id: asyncio.Task}, at most one repost worker per channel
+sticky_locks = {}    # {channel_id: asyncio.Lock} so the worker and /stick /unstick never send at the same time
 vote_data = {} 
 media_cooldowns = {} # Stores (user_id, channel_id): timestamp
 is_purging = False
@@ -199,43 +225,155 @@ auth_flow = None
 ytmusic = None
 spotify = None
 
+# --- LOG SINK ---
+class LogSink:
+    def __init__(self, max_lines=LOG_QUEUE_LIMIT, flush_seconds=LOG_FLUSH_SECONDS):
+        self.max_lines = max_lines
+        self.flush_seconds = flush_seconds
+        self.lines = []
+        self.size = 0      # Characters waiting (with newlines)
+        self.dropped = 0   # Lines turned away since the last flush
+        self.task = None
+        self.sleeping = False
+
+    def add(self, line):
+        if len(self.lines) >= self.max_lines:
+            self.dropped += 1
+            return
+        line = line[:LOG_MESSAGE_LIMIT]
+        self.lines.append(line)
+        self.size += len(line) + 1
+        self._schedule()
+
+    def _schedule(self):
+        full = self.size >= LOG_MESSAGE_LIMIT
+        if self.task and not self.task.done():
+            # A waiting flush is brought forward once a whole message is ready; a running one reschedules itself
+            if not (full and self.sleeping): return
+            self.task.cancel()
+        self.task = asyncio.create_task(self._flush_after(0 if full else self.flush_seconds))
+
+    async def _flush_after(self, delay):
+        self.sleeping = True
+        await asyncio.sleep(delay)
+        self.sleeping = False
+        try: await self.flush()
+        except Exception as e: print(f"Log flush failed: {e}")
+        if self.lines or self.dropped:
+            self.task = asyncio.create_task(self._flush_after(0 if self.size >= LOG_MESSAGE_LIMIT else self.flush_seconds))
+
+    def _pack(self, lines):
+        """Joins lines into as few messages as possible without going over the length limit."""
+        messages, current = [], ""
+        for line in lines:
+            if current and len(current) + 1 + len(line) > LOG_MESSAGE_LIMIT:
+                messages.append(current)
+                current = line
+            else:
+                current = f"{current}\n{line}" if current else line
+        if current: messages.append(current)
+        return messages
+
+    async def flush(self):
+        lines, self.lines, self.size = self.lines, [], 0
+        if self.dropped:
+            lines.append(f"⚠️ {self.dropped} more log lines were skipped (log channel backlog).")
+            self.dropped = 0
+        channel = bot.get_channel(config['log_channel_id']) if config['log_channel_id'] else None
+        if not channel or not lines: return
+        for text in self._pack(lines):
+            # One failed send only loses that message, not everything packed after it
+            try: await submit(lambda text=text: channel.send(text), PRIORITY_LOG, route=("channel", channel.id))
+            except Exception as e: print(f"Log message failed to send ({len(text)} chars): {e}")
+
+log_sink = LogSink()
+
 # --- DATABASE HANDLER ---
 class DatabaseHandler:
+    # Field each collection is keyed by in memory (everything else uses "_id")
+    KEY_FIELDS = {"tasks": "message_id"}
+    COLLECTIONS = ["bot_config", "sticky_messages", "votes", "tasks", "user_lockouts"]
+
     def __init__(self, uri, db_name):
         self.file_path = os.path.join(BASE_DIR, "database.json")
-        self.data = self._load_from_file()
+        self.journal = Journal(self.file_path)
+        self.data = {name: {} for name in self.COLLECTIONS} # {collection: {key: doc}}
+        self.tasks_by_user = {} # {user_id: {message_id: None}} (a user can have several lists; oldest first)
+        self._load_from_file()
+
+    def _doc_key(self, name, value):
+        # Sticky channel IDs may have been saved as strings by older versions
+        if name == "sticky_messages":
+            try: return int(value)
+            except (TypeError, ValueError): return value
+        return value
+
+    def _put(self, name, doc):
+        key = self._doc_key(name, doc.get(self.KEY_FIELDS.get(name, "_id")))
+        collection = self.data.setdefault(name, {})
+        if name == "tasks":
+            old = collection.get(key)
+            if old is not None and old.get("user_id") != doc.get("user_id"):
+                self._unindex_task(old.get("user_id"), key)
+            self.tasks_by_user.setdefault(doc.get("user_id"), {})[key] = None
+        collection[key] = doc
+
+    def _remove(self, name, key):
+        key = self._doc_key(name, key)
+        doc = self.data.get(name, {}).pop(key, None)
+        if doc is not None and name == "tasks":
+            self._unindex_task(doc.get("user_id"), key)
+        return doc
+
+    def _unindex_task(self, user_id, message_id):
+        message_ids = self.tasks_by_user.get(user_id)
+        if message_ids is None: return
+        message_ids.pop(message_id, None)
+        if not message_ids: del self.tasks_by_user[user_id]
 
     def _load_from_file(self):
-        try:
-            with open(self.file_path, "r") as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {"bot_config": [], "sticky_messages": [], "votes": [], "tasks": [], "user_lockouts": []}
+        raw = self.journal.read_snapshot({})
+        for name, collection in raw.items():
+            if not isinstance(collection, list): continue
+            for doc in collection:
+                self._put(name, doc)
+        for op in self.journal.read_ops():
+            if op["op"] == "put": self._put(op["c"], op["doc"])
+            elif op["op"] == "del": self._remove(op["c"], op["match"][self.KEY_FIELDS.get(op["c"], "_id")])
+
+    def _snapshot(self):
+        """The on-disk format stays a list of docs per collection."""
+        return {name: list(docs.values()) for name, docs in self.data.items()}
 
     def _save_to_file(self):
-        with open(self.file_path, "w") as f:
-            json.dump(self.data, f, indent=4, default=str)
+        """Writes the whole database as a fresh snapshot (the journal handles everyday saves)."""
+        self.journal.compact(self._snapshot())
+
+    def _log(self, *ops):
+        self.journal.append(*ops)
+        self.journal.maybe_compact(self._snapshot)
 
     async def load_config(self):
-        collection = self.data.get("bot_config", [])
-        for doc in collection:
-            if doc.get("_id") == "config":
-                return doc
-        return {}
+        return self.data["bot_config"].get("config", {})
 
     async def save_config(self, config_data):
         data_to_save = config_data.copy()
         data_to_save["_id"] = "config"
-        collection = self.data.get("bot_config", [])
-        collection = [d for d in collection if d.get("_id") != "config"]
-        collection.append(data_to_save)
-        self.data["bot_config"] = collection
-        self._save_to_file()
+        self._put("bot_config", data_to_save)
+        self._log({"op": "put", "c": "bot_config", "doc": data_to_save})
+
+    async def load_jail_timeouts(self):
+        doc = self.data["bot_config"].get("jail")
+        return doc.get("active_timeouts", {}) if doc else None
+
+    async def save_jail_timeouts(self, timeouts):
+        new_doc = {"_id": "jail", "active_timeouts": timeouts}
+        self._put("bot_config", new_doc)
+        self._log({"op": "put", "c": "bot_config", "doc": new_doc})
 
     async def load_stickies(self):
         data = {}
-        collection = self.data.get("sticky_messages", [])
-        for doc in collection:
+        for doc in self.data["sticky_messages"].values():
             try:
                 cid = int(doc.get('_id', 0))
                 if cid == 0: continue
@@ -254,82 +392,60 @@ class DatabaseHandler:
 
     async def save_sticky(self, channel_id, content, last_msg_id, last_time):
         new_doc = {"_id": int(channel_id), "content": content, "last_msg_id": last_msg_id, "last_time": last_time}
-        collection = self.data.get("sticky_messages", [])
-        collection = [d for d in collection if int(d.get("_id", 0)) != int(channel_id)]
-        collection.append(new_doc)
-        self.data["sticky_messages"] = collection
-        self._save_to_file()
+        self._put("sticky_messages", new_doc)
+        self._log({"op": "put", "c": "sticky_messages", "doc": new_doc})
 
     async def delete_sticky(self, channel_id):
-        collection = self.data.get("sticky_messages", [])
-        collection = [d for d in collection if int(d.get("_id", 0)) != int(channel_id)]
-        self.data["sticky_messages"] = collection
-        self._save_to_file()
+        self._remove("sticky_messages", int(channel_id))
+        self._log({"op": "del", "c": "sticky_messages", "match": {"_id": int(channel_id)}})
 
     async def load_votes(self):
         data = {}
-        collection = self.data.get("votes", [])
-        for doc in collection:
+        for doc in self.data["votes"].values():
             try: data[int(doc['_id'])] = doc.get('voters', [])
             except: pass
         return data
 
     async def save_vote(self, target_id, voters):
-        new_doc = {"_id": target_id, "voters": voters}
-        collection = self.data.get("votes", [])
-        collection = [d for d in collection if d.get("_id") != target_id]
-        if voters: collection.append(new_doc)
-        self.data["votes"] = collection
-        self._save_to_file()
+        if voters:
+            new_doc = {"_id": target_id, "voters": voters}
+            self._put("votes", new_doc)
+            self._log({"op": "put", "c": "votes", "doc": new_doc})
+        else:
+            self._remove("votes", target_id)
+            self._log({"op": "del", "c": "votes", "match": {"_id": target_id}})
 
     # --- TASK METHODS (BETTER BUGGY) ---
     async def load_tasks(self):
-        return self.data.get("tasks", [])
+        return list(self.data["tasks"].values())
 
     async def save_task(self, task_data):
-        collection = self.data.get("tasks", [])
-        # Update existing by removing old version first
-        collection = [d for d in collection if d.get("message_id") != task_data["message_id"]]
-        collection.append(task_data)
-        self.data["tasks"] = collection
-        self._save_to_file()
+        # Replaces any older version of the same list
+        self._put("tasks", task_data)
+        self._log({"op": "put", "c": "tasks", "key": ["message_id"], "doc": task_data})
 
     async def delete_task(self, message_id):
-        collection = self.data.get("tasks", [])
-        collection = [d for d in collection if d.get("message_id") != message_id]
-        self.data["tasks"] = collection
-        self._save_to_file()
+        self._remove("tasks", message_id)
+        self._log({"op": "del", "c": "tasks", "match": {"message_id": message_id}})
     
     async def find_task_by_user(self, user_id):
-        collection = self.data.get("tasks", [])
-        for doc in collection:
-            if doc.get("user_id") == user_id:
-                return doc
+        for message_id in self.tasks_by_user.get(user_id, {}):
+            return self.data["tasks"].get(message_id)
         return None
 
     # --- LOCKOUT METHODS (MAMABUG) ---
     async def get_user_lockout(self, user_id):
-        collection = self.data.get("user_lockouts", [])
-        for doc in collection:
-            if doc.get("_id") == user_id:
-                return doc
-        return None
+        return self.data["user_lockouts"].get(user_id)
 
     async def save_user_lockout(self, user_id, data):
-        collection = self.data.get("user_lockouts", [])
-        # Remove existing
-        collection = [d for d in collection if d.get("_id") != user_id]
         new_doc = {"_id": user_id}
         new_doc.update(data)
-        collection.append(new_doc)
-        self.data["user_lockouts"] = collection
-        self._save_to_file()
+        self._put("user_lockouts", new_doc)
+        self._log({"op": "put", "c": "user_lockouts", "doc": new_doc})
 
     async def delete_user_lockout(self, user_id):
-        collection = self.data.get("user_lockouts", [])
-        collection = [d for d in collection if d.get("_id") != user_id]
-        self.data["user_lockouts"] = collection
-        self._save_to_file()
+        self._remove("user_lockouts", user_id)
+        self._log({"op": "del", "c": "user_lockouts", "match": {"_id": user_id}})
 
 def clean_id(mention_str):
     return int(re.sub(r'[^0-9]', '', str(mention_str)))
@@ -353,6 +469,10 @@ async def load_initial_config():
     if "lockout_target_role_id" not in config: config["lockout_target_role_id"] = 0
     if "time_zones" not in config: config["time_zones"] = []
     if "active_timeouts" not in config: config["active_timeouts"] = {}
+    # Sentences live in their own doc; older versions kept them inside the config
+    jail_timeouts = await db.load_jail_timeouts()
+    if jail_timeouts is None: await db.save_jail_timeouts(config["active_timeouts"])
+    else: config["active_timeouts"] = jail_timeouts
 
     # Add message 5 if missing from old config
     if "5" not in config["dm_messages"]:
@@ -362,24 +482,12 @@ async def load_initial_config():
     print("Configuration loaded.")
 
 async def save_config_to_db():
-    await db.save_config(config)
+    await db.save_config({k: v for k, v in config.items() if k != "active_timeouts"})
 
 def is_admin_check(interaction: discord.Interaction) -> bool:
     if interaction.user.guild_permissions.administrator: return True
     return any(role.id in config['admin_role_id'] for role in interaction.user.roles)
 
-def is_time_in_range(start_str, end_str, current_dt):
-    current_time = current_dt.time()
-    try:
-        start_time = datetime.datetime.strptime(start_str, "%H:%M").time()
-        end_time = datetime.datetime.strptime(end_str, "%H:%M").time()
-        if start_time < end_time:
-            return start_time <= current_time <= end_time
-        else: 
-            return current_time >= start_time or current_time <= end_time
-    except:
-        return False
-
 # --- MUSIC SETUP ---
 async def load_youtube_service():
     global youtube
@@ -587,13 +695,16 @@ intents = discord.Intents.all()
 bot = commands.Bot(command_prefix="!", intents=intents, help_command=None)
 # Use a simple UTC-5 offset for EST time
 EST_TZ = datetime.timezone(datetime.timedelta(hours=-5))
+LOCKOUT_OFFSET_HOURS = -5 # Lockout windows are read in EST too
+
+# {user_id: next lock/unlock time}; built from user_lockouts and only changed by the lockout commands
+lockout_schedule = LockoutSchedule()
+lockout_task = None
 
 async def send_log(text):
     if config['log_channel_id'] == 0: return
-    channel = bot.get_channel(config['log_channel_id'])
-    if channel:
-        timestamp = datetime.datetime.now().strftime("%H:%M:%S")
-        await channel.send(f"`[{timestamp}]` 📝 {text}")
+    timestamp = datetime.datetime.now().strftime("%H:%M:%S")
+    log_sink.add(f"`[{timestamp}]` 📝 {text}")
 
 @tasks.loop(seconds=5)
 async def check_manager_logs():
@@ -602,12 +713,42 @@ async def check_manager_logs():
         try:
             with open(IPC_FILE, "r") as f: queue = json.load(f)
             if queue:
-                channel = bot.get_channel(config['log_channel_id'])
-                if channel:
-                    for msg in queue: await channel.send(msg); await asyncio.sleep(1) 
+                for msg in queue: log_sink.add(msg)
                 with open(IPC_FILE, "w") as f: json.dump([], f)
         except: pass
 
+async def _history_page(channel, limit, before):
+    return [msg async for msg in channel.history(limit=limit, before=before)]
+
+async def purge_channel(channel, limit, check, priority):
+    """
+    Deletes up to limit (None = all) of the newest messages that pass check, like channel.purge. Each page
+    of history and each delete batch is a separate submit(), so a long purge never holds the scheduler.
+    """
+    deleted = []
+    before = None
+    scanned = 0
+    bulk_cutoff = discord.utils.utcnow() - datetime.timedelta(days=14) # Bulk delete only takes messages newer than this
+    while limit is None or scanned < limit:
+        size = 100 if limit is None else min(100, limit - scanned)
+        page = await submit(lambda before=before, size=size: _history_page(channel, size, before), priority, route=("fetch", channel.id))
+        if not page: break
+        before = page[-1]
+        scanned += len(page)
+        matches = [msg for msg in page if check(msg)]
+        recent = [msg for msg in matches if msg.created_at > bulk_cutoff]
+        for i in range(0, len(recent), 100):
+            batch = recent[i:i + 100]
+            if len(batch) == 1: await submit(batch[0].delete, priority, route=("channel", channel.id))
+            else: await submit(lambda batch=batch: channel.delete_messages(batch), priority, route=("channel", channel.id))
+            deleted.extend(batch)
+        for msg in matches:
+            if msg.created_at > bulk_cutoff: continue
+            await submit(msg.delete, priority, route=("channel", channel.id))
+            deleted.append(msg)
+        if len(page) < size: break
+    return deleted
+
 async def nightly_purge():
     global is_purging
     is_purging = True
@@ -623,7 +764,7 @@ async def nightly_purge():
                         if channel_id in config.get('link_safe_channels', []) and ("http" in msg.content): return False
                         return True
                     # LIMIT=1000 is safer than None for reliability
-                    deleted = await channel.purge(limit=1000, check=should_delete)
+                    deleted = await purge_channel(channel, 1000, should_delete, PRIORITY_BACKGROUND)
                     count += len(deleted)
             except Exception as e:
                  print(f"Purge Error: {e}")
@@ -641,7 +782,7 @@ async def check_token_validity_task():
 # New Robust Task Loop
 @tasks.loop(minutes=1)
 async def task_loop():
-    # Get current time in EST
+    # Get current time in EST (lockouts run on their own schedule, see lockout_worker)
     now = datetime.datetime.now(EST_TZ)
     
     # 3:00 AM Purge
@@ -652,78 +793,90 @@ async def task_loop():
     if now.hour == 4 and now.minute == 0:
         await check_token_validity_task()
 
-    # --- MAMABUG LOCKOUT LOGIC ---
-    if not config.get('lockout_target_role_id'): return
-    target_role_id = config['lockout_target_role_id']
-    
-    # Iterate through users with lockouts
-    # Note: We can't iterate DB directly in loop, so we assume role-based checking from config['time_zones'] if used, 
-    # OR we iterate members in guild. For simplicity + optimization, we'll iterate guilds -> members.
-    
-    current_utc = datetime.datetime.now(datetime.timezone.utc)
-    
+# --- MAMABUG LOCKOUT LOGIC ---
+def schedule_lockout(user_id, user_data):
+    """(Re)plans a user's next lock/unlock. Users without a window drop out of the schedule."""
+    if not user_data or 'start' not in user_data:
+        return lockout_schedule.remove(user_id)
+    lockout_schedule.set(user_id, user_data['start'], user_data['end'], LOCKOUT_OFFSET_HOURS)
+
+def rebuild_lockout_schedule():
+    lockout_schedule.clear()
+    for user_id, user_data in db.data["user_lockouts"].items():
+        schedule_lockout(user_id, user_data)
+    print(f"✅ Scheduled {len(lockout_schedule)} lockouts.")
+
+async def apply_lockout(user_id, should_be_locked):
+    """Moves one user's target role to match their window (the old per-minute check, for one user)."""
+    target_role_id = config.get('lockout_target_role_id')
+    if not target_role_id: return
+    user_data = await db.get_user_lockout(user_id)
+    if not user_data or 'start' not in user_data: return
+
     for guild in bot.guilds:
+        member = guild.get_member(user_id)
         target_role = guild.get_role(target_role_id)
-        if not target_role: continue
-        
-        # NOTE: iterating all members every minute can be heavy for huge servers. 
-        # But for your personal bot usage, it's fine.
-        for member in guild.members:
-            if member.bot: continue
-            
-            user_data = await db.get_user_lockout(member.id)
-            if not user_data or 'start' not in user_data: continue
-            
-            # Determine local time for user (simplified: assume EST or use offset if you had it)
-            # Defaulting to EST for now as per your usual preference
-            local_time = datetime.datetime.now(EST_TZ)
-            
-            should_be_locked = is_time_in_range(user_data['start'], user_data['end'], local_time)
-            has_role = target_role in member.roles
-            was_locked_by_bot = user_data.get('locked_by_bot', False)
+        if not member or member.bot or not target_role: continue
 
-            if should_be_locked and has_role:
-                try: 
-                    await member.remove_roles(target_role)
-                    await db.save_user_lockout(member.id, {"start": user_data['start'], "end": user_data['end'], "repeat": user_data['repeat'], "locked_by_bot": True})
-                    await send_log(f"🔒 **Lockout:** Removed role from {member.name}.")
-                except: pass
-            elif not should_be_locked and not has_role and was_locked_by_bot:
-                try: 
-                    await member.add_roles(target_role)
-                    await db.save_user_lockout(member.id, {"start": user_data['start'], "end": user_data['end'], "repeat": user_data['repeat'], "locked_by_bot": False})
-                    await send_log(f"🔓 **Lockout:** Restored role to {member.name}.")
-                except: pass
+        has_role = target_role in member.roles
+        was_locked_by_bot = user_data.get('locked_by_bot', False)
+
+        if should_be_locked and has_role:
+            try:
+                await submit(lambda: member.remove_roles(target_role), PRIORITY_MODERATION, route=("roles", guild.id))
+                await db.save_user_lockout(user_id, {"start": user_data['start'], "end": user_data['end'], "repeat": user_data['repeat'], "locked_by_bot": True})
+                await send_log(f"🔒 **Lockout:** Removed role from {member.name}.")
+            except: pass
+        elif not should_be_locked and not has_role and was_locked_by_bot:
+            try:
+                await submit(lambda: member.add_roles(target_role), PRIORITY_MODERATION, route=("roles", guild.id))
+                await db.save_user_lockout(user_id, {"start": user_data['start'], "end": user_data['end'], "repeat": user_data['repeat'], "locked_by_bot": False})
+                await send_log(f"🔓 **Lockout:** Restored role to {member.name}.")
+            except: pass
+
+async def lockout_worker():
+    """Sleeps until the next lock or unlock is due; idle minutes cost nothing."""
+    await bot.wait_until_ready()
+    while True:
+        await lockout_schedule.wait()
+        for user_id, should_be_locked in lockout_schedule.pop_due():
+            await apply_lockout(user_id, should_be_locked)
 
 @bot.event
 async def on_ready():
     global db, sticky_data, vote_data
     try:
-        db = DatabaseHandler(None, DB_NAME)
-        await load_initial_config()
-        sticky_data = await db.load_stickies()
-        vote_data = await db.load_votes()
-        
-        # --- SYNC COMMANDS ---
-        synced = await bot.tree.sync()
-        print(f"✅ Synced {len(synced)} Slash Commands.")
-        
-        # --- RESTORE TASKS ---
-        active_tasks = await db.load_tasks()
-        count = 0
-        for doc in active_tasks:
-            try:
-                view = TaskView(
-                    user_id=doc['user_id'], 
-                    total=doc['total'], 
-                    state=doc['state'], 
-                    message_id=doc['message_id']
-                )
-                bot.add_view(view)
-                count += 1
-            except Exception as e:
-                print(f"Failed to restore task view: {e}")
-        print(f"✅ Restored {count} active tasks.")
+        if db is None:
+            # Only on the first connect; a reconnect keeps the in-memory state (and the journal's unflushed writes)
+            db = DatabaseHandler(None, DB_NAME)
+            await load_initial_config()
+            sticky_data = await db.load_stickies()
+            vote_data = await db.load_votes()
+            jail.load(config['active_timeouts'])
+
+            # --- SYNC COMMANDS ---
+            synced = await bot.tree.sync()
+            print(f"✅ Synced {len(synced)} Slash Commands.")
+
+            # --- RESTORE TASKS ---
+            active_tasks = await db.load_tasks()
+            count = 0
+            for doc in active_tasks:
+                try:
+                    view = TaskView(
+                        user_id=doc['user_id'], 
+                        total=doc['total'], 
+                        state=doc['state'], 
+                        message_id=doc['message_id']
+                    )
+                    bot.add_view(view)
+                    count += 1
+                except Exception as e:
+                    print(f"Failed to restore task view: {e}")
+            print(f"✅ Restored {count} active tasks.")
+
+        # Voice events may have been missed while disconnected
+        await sync_jail()
         
     except Exception as e: print(f"DB Error or Sync Error: {e}")
     print(f"Hello! I am logged in as {bot.user}")
@@ -732,6 +885,11 @@ async def on_ready():
     
     # Start the new task loop
     if not task_loop.is_running(): task_loop.start()
+
+    global lockout_task
+    if db and (lockout_task is None or lockout_task.done()):
+        rebuild_lockout_schedule()
+        lockout_task = asyncio.create_task(lockout_worker())
     
     await load_youtube_service()
     load_music_services()
@@ -755,8 +913,7 @@ async def on_raw_reaction_add(payload):
         if c:
             try:
                 await c.set_permissions(member, read_messages=True, send_messages=True)
-                msg = await channel.fetch_message(payload.message_id)
-                await msg.remove_reaction(payload.emoji, member)
+                await submit(lambda: channel.get_partial_message(payload.message_id).remove_reaction(payload.emoji, member), PRIORITY_INTERACTIVE, route=("reactions", channel.id))
                 await send_log(f"🔓 Access granted to **{member.name}**.")
             except: pass
 
@@ -764,7 +921,7 @@ async def on_raw_reaction_add(payload):
     if channel.id in config['dm_req_channels']:
         if str(payload.emoji) in config['dm_reacts']:
             try:
-                message = await channel.fetch_message(payload.message_id)
+                message = await submit(lambda: channel.fetch_message(payload.message_id), PRIORITY_INTERACTIVE, route=("fetch", channel.id))
                 if member in message.mentions:
                     msg_index = -1
                     if str(payload.emoji) == config['dm_reacts'][0]: msg_index = "1"
@@ -818,47 +975,57 @@ async def on_member_update(before, after):
                 await send_log(f"✅ Ticket created for **{after.name}**.")
             except Exception as e: await send_log(f"❌ Failed to create ticket: {e}")
 
+    # Lockout: the schedule only acts on transitions, so take the role back if it's re-added mid-window
+    target_role_id = config.get('lockout_target_role_id')
+    if target_role_id and after.id in lockout_schedule:
+        if any(r.id == target_role_id for r in after.roles) and not any(r.id == target_role_id for r in before.roles):
+            user_data = await db.get_user_lockout(after.id)
+            if user_data and 'start' in user_data and is_locked_at(user_data['start'], user_data['end'], datetime.datetime.now(EST_TZ)):
+                await apply_lockout(after.id, True)
+
 # --- MAMABUG JAIL LOGIC ---
 @bot.event
 async def on_voice_state_update(member, before, after):
-    # Jail VC Check
+    # Jail VC Check: only joins and leaves matter, the timers do the rest
     jail_vc_id = config.get('jail_vc_id')
     if not jail_vc_id: return
 
     user_id = str(member.id)
-    active_timeouts = config.get('active_timeouts', {})
-    
-    if user_id not in active_timeouts: return
+    if user_id not in jail: return
 
-    timeout_data = active_timeouts[user_id]
-    now = datetime.datetime.now().timestamp()
+    was_in = before.channel is not None and before.channel.id == jail_vc_id
+    now_in = after.channel is not None and after.channel.id == jail_vc_id
+    if now_in and not was_in:
+        await jail.enter(user_id)
+    elif was_in and not now_in:
+        await jail.leave(user_id)
 
-    # Entering Jail VC
-    if after.channel and after.channel.id == jail_vc_id:
-        timeout_data["last_check"] = now
-        await save_config_to_db()
-    
-    # Leaving Jail VC
-    elif (not after.channel or after.channel.id != jail_vc_id) and before.channel and before.channel.id == jail_vc_id:
-        if timeout_data.get("last_check"):
-            diff = now - timeout_data["last_check"]
-            timeout_data["remaining_seconds"] = max(0, timeout_data["remaining_seconds"] - diff)
-            timeout_data["last_check"] = None
-            
-            # Check if sentence is over (unlikely on leave, but possible if they left right at 0)
-            if timeout_data["remaining_seconds"] <= 0:
-                target_role_id = config.get('lockout_target_role_id')
-                if target_role_id:
-                    role = member.guild.get_role(target_role_id)
-                    if role:
-                        try:
-                            await member.add_roles(role)
-                            del active_timeouts[user_id]
-                            await send_log(f"🔓 {member.mention} completed timeout and regained access!")
-                        except Exception as e:
-                            print(f"Failed to restore role: {e}")
-            
-            await save_config_to_db()
+async def release_from_jail(user_id):
+    """Called by the jail timers the moment a sentence is fully served."""
+    target_role_id = config.get('lockout_target_role_id')
+    if not target_role_id: return
+    for guild in bot.guilds:
+        member = guild.get_member(int(user_id))
+        role = guild.get_role(target_role_id)
+        if not member or not role: continue
+        try:
+            await submit(lambda: member.add_roles(role), PRIORITY_MODERATION, route=("roles", guild.id))
+            await jail.release(user_id)
+            await send_log(f"🔓 {member.mention} completed timeout and regained access!")
+        except Exception as e:
+            print(f"Failed to restore role: {e}")
+        return
+
+async def sync_jail():
+    """Starts/stops clocks for whoever is (not) in the jail VC right now, in case events were missed while offline."""
+    channel = bot.get_channel(config['jail_vc_id']) if config.get('jail_vc_id') else None
+    await jail.sync({str(m.id) for m in channel.members} if channel else set())
+
+async def save_jail_timeouts():
+    await db.save_jail_timeouts(config['active_timeouts'])
+
+# Sentences in config['active_timeouts']; only their own doc is saved, and only when someone's state changes
+jail = JailTimers(release_from_jail, save_jail_timeouts)
 
 # --- SLASH COMMANDS ---
 
@@ -912,6 +1079,7 @@ async def setsetting(interaction: discord.Interaction, key: str, value: str):
         else: new_val = value
         config[key] = new_val
         await save_config_to_db()
+        if key == 'lockout_target_role_id': rebuild_lockout_schedule()
         await interaction.response.send_message(f"✅ Saved `{key}` as `{new_val}`.")
     except: await interaction.response.send_message("❌ Error: Check value.", ephemeral=True)
 
@@ -1047,15 +1215,19 @@ async def entercode(interaction: discord.Interaction, code: str):
 @app_commands.check(is_admin_check)
 async def stick(interaction: discord.Interaction, text: str):
     await interaction.response.send_message("✅ Sticky set.", ephemeral=True)
-    msg = await interaction.channel.send(text)
-    sticky_data[interaction.channel.id] = [text, msg.id, datetime.datetime.utcnow().timestamp()]
+    async with sticky_locks.setdefault(interaction.channel.id, asyncio.Lock()):
+        msg = await submit(lambda: interaction.channel.send(text), PRIORITY_INTERACTIVE, route=("channel", interaction.channel.id))
+        sticky_data[interaction.channel.id] = [text, msg.id, datetime.datetime.utcnow().timestamp()]
+        track_sticky_message(interaction.channel.id, msg.id, bot.user.id)
     await db.save_sticky(interaction.channel.id, text, msg.id, sticky_data[interaction.channel.id][2])
 
 @bot.tree.command(name="unstick", description="Admin: Removes the sticky message in the current channel.")
 @app_commands.check(is_admin_check)
 async def unstick(interaction: discord.Interaction):
     if interaction.channel.id in sticky_data:
-        sticky_data.pop(interaction.channel.id)
+        async with sticky_locks.setdefault(interaction.channel.id, asyncio.Lock()):
+            sticky_data.pop(interaction.channel.id)
+            sticky_recent.pop(interaction.channel.id, None)
         await db.delete_sticky(interaction.channel.id)
         await interaction.response.send_message("✅ Removed.")
     else:
@@ -1070,6 +1242,11 @@ async def liststickies(interaction: discord.Interaction):
         text += f"<#{cid}>: {data[0][:50]}...\n"
     await interaction.response.send_message(text)
 
+@bot.tree.command(name="reststats", description="Admin: Shows how long Discord API calls waited in the queue.")
+@app_commands.check(is_admin_check)
+async def reststats(interaction: discord.Interaction):
+    await interaction.response.send_message(f"📊 {format_stats()}", ephemeral=True)
+
 # --- PURGE COMMAND ---
 @bot.tree.command(name="purge", description="Admin: Purge messages with confirmation.")
 @app_commands.check(is_admin_check)
@@ -1136,7 +1313,7 @@ async def purge(interaction: discord.Interaction, target: str, limit: typing.Opt
 
     for c in channels:
         try:
-            deleted = await c.purge(limit=limit, check=check_msg)
+            deleted = await purge_channel(c, limit, check_msg, PRIORITY_MODERATION)
             total += len(deleted)
         except Exception as e: 
             print(f"Purge error in {c.name}: {e}")
@@ -1349,6 +1526,7 @@ async def task(interaction: discord.Interaction, amount: int):
 async def setjail(interaction: discord.Interaction, channel: discord.VoiceChannel):
     config['jail_vc_id'] = channel.id
     await save_config_to_db()
+    await sync_jail()
     await interaction.response.send_message(f"✅ Jail VC set to {channel.name}.")
 
 @bot.tree.command(name="timeout", description="Admin: Puts a user in jail.")
@@ -1366,21 +1544,11 @@ async def timeout(interaction: discord.Interaction, member: discord.Member, minu
     if not role: return await interaction.response.send_message("❌ Role not found.", ephemeral=True)
 
     try:
-        await member.remove_roles(role)
+        await submit(lambda: member.remove_roles(role), PRIORITY_MODERATION, route=("roles", interaction.guild.id))
         
-        user_id = str(member.id)
-        active_timeouts = config.get('active_timeouts', {})
-        active_timeouts[user_id] = {
-            "remaining_seconds": minutes * 60,
-            "last_check": None
-        }
-        
-        # If in jail already, start timer
-        if member.voice and member.voice.channel and member.voice.channel.id == config['jail_vc_id']:
-            active_timeouts[user_id]["last_check"] = datetime.datetime.now().timestamp()
-            
-        config['active_timeouts'] = active_timeouts
-        await save_config_to_db()
+        # If in jail already, the clock starts now
+        in_jail = bool(member.voice and member.voice.channel and member.voice.channel.id == config['jail_vc_id'])
+        await jail.jail(str(member.id), minutes * 60, in_jail=in_jail)
         
         jail_channel = interaction.guild.get_channel(config['jail_vc_id'])
         await interaction.response.send_message(f"𐂺 {member.mention} jailed for **{minutes} mins**. Stay in {jail_channel.mention} to unlock!")
@@ -1401,6 +1569,7 @@ async def lockout(interaction: discord.Interaction, start: str, end: str, repeat
         
     data = {"start": start, "end": end, "repeat": repeat.lower(), "locked_by_bot": False}
     await db.save_user_lockout(interaction.user.id, data)
+    schedule_lockout(interaction.user.id, data)
     await interaction.response.send_message(f"✅ Lockout set for **{start}** to **{end}**!")
 
 @bot.tree.command(name="lockoutview", description="User: View your lockout settings.")
@@ -1416,16 +1585,18 @@ async def lockoutclear(interaction: discord.Interaction):
     if not user_data: return await interaction.response.send_message("You don't have a lockout.", ephemeral=True)
     
     # Check if active
-    if 'start' in user_data and is_time_in_range(user_data['start'], user_data['end'], datetime.datetime.now()):
+    if 'start' in user_data and is_locked_at(user_data['start'], user_data['end'], datetime.datetime.now(EST_TZ)):
          return await interaction.response.send_message("❌ You cannot clear your lockout while it is active!", ephemeral=True)
          
     await db.delete_user_lockout(interaction.user.id)
+    lockout_schedule.remove(interaction.user.id)
     await interaction.response.send_message("🗑️ Lockout cleared.")
 
 @bot.tree.command(name="adminclear", description="Admin: Force clear a user's lockout.")
 @app_commands.check(is_admin_check)
 async def adminclear(interaction: discord.Interaction, target: discord.Member):
     await db.delete_user_lockout(target.id)
+    lockout_schedule.remove(target.id)
     await interaction.response.send_message(f"🧹 Cleared lockout for **{target.display_name}**.")
 
 @bot.tree.command(name="help", description="Shows the help menu.")
@@ -1442,8 +1613,75 @@ async def help(interaction: discord.Interaction):
     embed.add_field(name="♻️ System", value="`/sync`", inline=False)
     await interaction.response.send_message(embed=embed)
 
+# --- STICKY TRACKING ---
+def track_sticky_message(channel_id, message_id, author_id):
+    recent = sticky_recent.setdefault(channel_id, [])
+    entry = (message_id, author_id)
+    if entry in recent: return
+    bisect.insort(recent, entry)
+    del recent[:-STICKY_TRACK_DEPTH]
+
+def untrack_sticky_messages(channel_id, message_ids):
+    recent = sticky_recent.get(channel_id)
+    if recent: recent[:] = [e for e in recent if e[0] not in message_ids]
+
+async def last_sticky_channel_author(channel):
+    """Author id of the newest message in a sticky channel. Only reads history when nothing is tracked yet."""
+    recent = sticky_recent.get(channel.id)
+    if not recent:
+        async for msg in channel.history(limit=1):
+            track_sticky_message(channel.id, msg.id, msg.author.id)
+        recent = sticky_recent.get(channel.id)
+    return recent[-1][1] if recent else None
+
+def poke_sticky(channel):
+    """A message landed in a sticky channel: once the sticky is older than sticky_delay_seconds, start its repost worker."""
+    data = sticky_data.get(channel.id)
+    if not data: return
+    last_time = data[2]
+    if isinstance(last_time, datetime.datetime): last_time = last_time.timestamp()
+    if datetime.datetime.utcnow().timestamp() - last_time <= config['sticky_delay_seconds']: return
+    task = sticky_workers.get(channel.id)
+    if task is None or task.done():
+        sticky_workers[channel.id] = asyncio.create_task(sticky_worker(channel))
+
+async def sticky_worker(channel):
+    """Reposts the sticky once (messages arriving meanwhile share this repost) and saves it."""
+    cid = channel.id
+    lock = sticky_locks.setdefault(cid, asyncio.Lock())
+    try:
+        async with lock:
+            if cid not in sticky_data: return
+            content, last_id, _ = sticky_data[cid]
+            # Only resend if the last message in the channel (tracked from gateway events) wasn't me
+            if await last_sticky_channel_author(channel) == bot.user.id: return
+            if last_id:
+                try: await submit(lambda: channel.get_partial_message(last_id).delete(), PRIORITY_BACKGROUND, route=("channel", cid))
+                except: pass
+            new_msg = await submit(lambda: channel.send(content), PRIORITY_BACKGROUND, route=("channel", cid))
+            track_sticky_message(cid, new_msg.id, bot.user.id)
+            sticky_data[cid][1] = new_msg.id
+            sticky_data[cid][2] = datetime.datetime.utcnow().timestamp()
+        await db.save_sticky(cid, content, new_msg.id, sticky_data[cid][2])
+    except Exception as e:
+        print(f"Sticky Error: {e}")
+    finally:
+        if sticky_workers.get(cid) is asyncio.current_task(): sticky_workers.pop(cid, None)
+
+@bot.event
+async def on_raw_message_delete(payload):
+    if payload.channel_id in sticky_recent:
+        untrack_sticky_messages(payload.channel_id, {payload.message_id})
+
+@bot.event
+async def on_raw_bulk_message_delete(payload):
+    if payload.channel_id in sticky_recent:
+        untrack_sticky_messages(payload.channel_id, set(payload.message_ids))
+
 @bot.event
 async def on_message(message):
+    if message.channel.id in sticky_data:
+        track_sticky_message(message.channel.id, message.id, message.author.id)
     if message.author.bot: return
     if message.type == discord.MessageType.pins_add: 
         try: await message.delete(); return
@@ -1465,7 +1703,7 @@ async def on_message(message):
             else:
                 last_time = media_cooldowns.get((message.author.id, message.channel.id), 0)
                 if datetime.datetime.utcnow().timestamp() - last_time > 300: # 5 mins
-                    try: await message.delete()
+                    try: await submit(message.delete, PRIORITY_MODERATION, route=("channel", message.channel.id))
                     except: pass
                     return
 
@@ -1489,7 +1727,7 @@ async def on_message(message):
         if not is_admin_user:
             if not valid_request:
                 try:
-                    await message.delete()
+                    await submit(message.delete, PRIORITY_MODERATION, route=("channel", message.channel.id))
                     raw_msg = config['dm_messages'].get("0", "Error: No text.")
                     formatted_msg = raw_msg.replace("{mention}", message.author.mention).replace("{requester}", message.author.mention)
                     await message.channel.send(formatted_msg, delete_after=5)
@@ -1506,7 +1744,7 @@ async def on_message(message):
             raw_msg = ""
             if has_role_1:
                 try:
-                    for e in config['dm_reacts']: await message.add_reaction(e)
+                    for e in config['dm_reacts']: await submit(lambda e=e: message.add_reaction(e), PRIORITY_INTERACTIVE, route=("reactions", message.channel.id))
                 except: pass
             
             elif has_role_2:
@@ -1525,25 +1763,7 @@ async def on_message(message):
 
     # --- 3. FIXED STICKY MESSAGES ---
     if message.channel.id in sticky_data:
-        content, last_id, last_time = sticky_data[message.channel.id]
-        if isinstance(last_time, datetime.datetime): last_time = last_time.timestamp()
-        
-        # Check if enough time has passed AND if the last message wasn't the sticky itself
-        if datetime.datetime.utcnow().timestamp() - last_time > config['sticky_delay_seconds']:
-            # Find the most recent message in the channel
-            try:
-                last_msg_in_channel = [msg async for msg in message.channel.history(limit=1)][0]
-                if last_msg_in_channel.author != bot.user: # Only resend if last msg wasn't me
-                    if last_id:
-                        try: 
-                            m = await message.channel.fetch_message(last_id)
-                            await m.delete()
-                        except: pass
-                    new_msg = await message.channel.send(content)
-                    sticky_data[message.channel.id][1] = new_msg.id
-                    sticky_data[message.channel.id][2] = datetime.datetime.utcnow().timestamp()
-                    await db.save_sticky(message.channel.id, content, new_msg.id, sticky_data[message.channel.id][2])
-            except: pass
+        poke_sticky(message.channel)
             
     # --- 4. MUSIC LINKS ---
     if config['music_channel_id'] != 0 and message.channel.id == config['music_channel_id']:
@@ -1551,7 +1771,7 @@ async def on_message(message):
         if "spotify.com" in message.content.lower():
              success_msg = await process_spotify_link(message.content)
              if success_msg is True: 
-                 await message.add_reaction("🎵")
+                 await submit(lambda: message.add_reaction("🎵"), PRIORITY_INTERACTIVE, route=("reactions", message.channel.id))
              else:
                  # It failed - Ping Admins
                  roles = [f"<@&{rid}>" for rid in config['admin_role_id']]
@@ -1567,7 +1787,7 @@ async def on_message(message):
             if v_id:
                 try: 
                     youtube.playlistItems().insert(part="snippet", body={"snippet": {"playlistId": config['playlist_id'], "resourceId": {"kind": "youtube#video", "videoId": v_id}}}).execute()
-                    await message.add_reaction("🎵")
+                    await submit(lambda: message.add_reaction("🎵"), PRIORITY_INTERACTIVE, route=("reactions", message.channel.id))
                 except Exception as e:
                      # It failed - Ping Admins
                      roles = [f"<@&{rid}>" for rid in config['admin_role_id']]
@@ -8,12 +8,13 @@ except ImportError:
 
 import discord
 from discord.ext import commands
-import json
 import os
 import asyncio
+from local_db import LocalCollection
+from rest_scheduler import submit, PRIORITY_INTERACTIVE
 
 # --- FUNCTION LIST ---
-# 1. LocalCollection Class: Handles database.json interactions.
+# 1. Collections: Shared LocalCollection (local_db.py) over database.json.
 # 2. load_config(): Loads the bot settings from the database.
 # 3. save_config_cache(): Updates the database with the current memory cache.
 # 4. Command: settings(): Shows configurations.
@@ -29,50 +30,6 @@ import asyncio
 # 14. Event: on_message(message): Handles age verification logic.
 
 # --- 1. DATABASE HANDLER ---
-DB_FILE = "database.json"
-
-class LocalCollection:
-    def __init__(self, name):
-        self.name = name
-
-    def _load_all(self):
-        try:
-            with open(DB_FILE, "r") as f:
-                return json.load(f)
-        except: return {}
-
-    def _save_all(self, data):
-        with open(DB_FILE, "w") as f:
-            json.dump(data, f, indent=4, default=str)
-
-    async def find_one(self, query):
-        all_data = self._load_all()
-        collection = all_data.get(self.name, [])
-        for doc in collection:
-            if all(doc.get(k) == v for k, v in query.items()):
-                return doc
-        return None
-
-    async def update_one(self, query, update, upsert=False):
-        all_data = self._load_all()
-        if self.name not in all_data: all_data[self.name] = []
-        
-        found = False
-        for doc in all_data[self.name]:
-            if all(doc.get(k) == v for k, v in query.items()):
-                if "$set" in update:
-                    doc.update(update["$set"])
-                found = True
-                break
-        
-        if not found and upsert:
-            new_doc = query.copy()
-            if "$set" in update:
-                new_doc.update(update["$set"])
-            all_data[self.name].append(new_doc)
-
-        self._save_all(all_data)
-
 config_col = LocalCollection("nsfw_ticket_config")
 
 # --- 2. BOT SETUP ---
@@ -207,8 +164,7 @@ async def on_raw_reaction_add(payload):
         # 1. Remove the reaction immediately
         channel = bot.get_channel(payload.channel_id)
         try:
-            message = await channel.fetch_message(payload.message_id)
-            await message.remove_reaction(payload.emoji, payload.member)
+            await submit(lambda: channel.get_partial_message(payload.message_id).remove_reaction(payload.emoji, payload.member), PRIORITY_INTERACTIVE, route=("reactions", channel.id))
         except: pass
 
         # 2. Check Permissions / Roles
@@ -6,23 +6,47 @@ from discord.ext import commands, tasks
 import json
 import os
 import time
-from datetime import datetime, timezone 
+from datetime import datetime, timezone, time as dt_time
 import asyncio 
+import sqlite3
+import heapq
+import hashlib
+import io
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from local_db import Journal, replay_ops
+from rest_scheduler import submit, PRIORITY_INTERACTIVE, PRIORITY_LOG, PRIORITY_BACKGROUND
+from delete_audit import find_deleter
+from group_ranking import GroupRanking
 
 # --- FUNCTION LIST ---
 # 1. DatabaseHandler Class:
-#    - __init__, _load_from_file, _save_to_file
+#    - __init__, _load_from_file, _save_to_file, _log, _sql, _index_points
 #    - load_config, save_config, load_stickies, save_sticky, delete_sticky
-#    - update_user_points, get_all_group_points, get_user_points, clear_points_by_group
+#    - update_user_points, bulk_merge_points, get_merged_seq, get_all_group_points, get_user_points, clear_points_by_group
+#    - get_group_ranking, _update_ranking, build_rankings
+#    - get_period_points, prune_history
+#    history_buckets (hour/day/week bucket starts for a timestamp)
+#    SqlitePointStore Class (optional points backend):
+#    - __init__, _migrate_from_json, merge, get_merged_seq, get_points, get_all_group_points, get_user_points, get_all_points, clear_group
+#    PointHistoryStore Class (points history in SQLite, for both backends):
+#    - __init__, _migrate_from_json, add, get, rollup, prune, clear_group
 # 2. Configuration:
 #    - load_initial_config, save_config_to_db
 # 3. Utility:
-#    - add_points_to_cache, is_category_tracked, _create_leaderboard_embed
-#    - refresh_group_leaderboard, check_admin_perms, is_user_admin
+#    - add_points_to_cache, replay_pending_points, rebuild_category_index, is_category_tracked, _create_leaderboard_embed
+#    - refresh_group_leaderboard, _embed_fingerprint, update_permanent_leaderboard
+#    - remember_display_name, resolve_display_names
+#    - credit_voice_time, _update_voice_eligibility, rebuild_voice_state
+#    - _update_vc_notify, _vc_notify_timer_done, _ping_vc_role
+#    - _schedule_delete_logs, _process_delete_logs, _build_delete_embed, _send_bulk_delete_log
+#    - check_admin_perms, is_user_admin
 # 4. Events:
-#    - on_ready, on_message, on_message_delete, on_reaction_add, on_voice_state_update
+#    - on_ready, on_message, on_message_delete, on_raw_bulk_message_delete, on_reaction_add, on_voice_state_update
+#    - on_member_join, on_user_update (keep the display name cache fresh)
+#    - on_guild_channel_update, on_guild_channel_delete (forget memoized channel groups)
 # 5. Tasks:
-#    - voice_time_checker, point_saver
+#    - point_saver
 # 6. Commands:
 #    - points (NEW), set_log_channel, set_vc_role, manage_admin_roles, set_permanent_leaderboard
 #    - clear_permanent_leaderboard, clear_group_points, show_leaderboard
@@ -35,6 +59,28 @@ PREFIX = "^"
 
 # Database configuration
 DB_NAME = "LeaderboardDB"
+POINTS_BACKEND = "json" # "json" keeps points in database.json, "sqlite" moves them to POINTS_DB_FILE
+POINTS_DB_FILE = "points.db"
+HISTORY_DB_FILE = "points_history.db" # Points history with the "json" backend (the "sqlite" backend keeps it in POINTS_DB_FILE)
+PENDING_POINTS_FILE = "pending_points.json" # Its .journal keeps POINT_CACHE safe between saves
+POINT_SAVE_INTERVAL = 300 # Seconds between point_saver merges
+# point_saver runs on clean clock marks (e.g. :00, :05, :10 ...) in UTC
+POINT_SAVE_TIMES = [
+    dt_time(hour=s // 3600, minute=s % 3600 // 60, second=s % 60, tzinfo=timezone.utc)
+    for s in range(0, 24 * 3600, POINT_SAVE_INTERVAL)
+]
+
+# Points history for ^leaderboard <Group> week/month. Every merge adds to the current hour bucket;
+# finished hours are rolled up into day and week buckets, so a period board only sums a handful of rows.
+HISTORY_RETENTION = {           # How long each rolled-up bucket size is kept, in seconds
+    "day": 62 * 24 * 3600,      # 2 months (enough for "this month")
+    "week": 53 * 7 * 24 * 3600  # 1 year
+}
+
+# Display names shown on leaderboards
+NAME_CACHE_TTL = 6 * 3600    # Seconds before a cached name is looked up again
+NAME_CACHE_SIZE = 5000       # Least recently used names are dropped past this
+NAME_FETCH_CONCURRENCY = 5   # fetch_user calls allowed at the same time
 
 # --- 2. BOT SETUP ---
 intents = discord.Intents.default()
@@ -62,39 +108,253 @@ DEFAULT_GROUPS = {
 # Global in-memory variables
 POINT_VALUES = DEFAULT_POINT_VALUES.copy()
 LEADERBOARD_GROUPS = DEFAULT_GROUPS.copy() 
-VOICE_TRACKER = {} 
+CATEGORY_GROUPS = {} # {category_id: group_key}, rebuilt whenever a group's categories change
+CHANNEL_GROUPS = {}  # {channel_id: group_key or None} memo for is_category_tracked
+VOICE_TRACKER = {} # {user_id: {'group', 'guild_id', 'since' (eligible since, or None), 'carry' (unpaid seconds)}}
+VOICE_CHANNEL_HUMANS = {} # {channel_id: set(user_id)} non-bot members in each voice channel
+VOICE_UNIT_SECONDS = 30 # POINT_VALUES['voice_interval'] is paid per this many eligible seconds
 POINT_CACHE = {}         
 LEADERBOARD_CACHE = {}   
 PERMANENT_LEADERBOARDS = {} 
+PERMANENT_MESSAGE_STATE = {} # {group_key: {'message': PartialMessage, 'fingerprint': str}} to skip unchanged edits
+DISPLAY_NAME_CACHE = OrderedDict() # {user_id str: (display name or None if the user is gone, expires at)}
 
 # Globals for Roles & Logging
 VC_NOTIFY_ROLE_ID = None
 ADMIN_ROLE_IDS = [] 
-VC_ACTIVE_STATE = {} 
+VC_ACTIVE_STATE = {} # {channel_id: {'start_time', 'pinged', 'timer' (pending call_later handle), 'due'}}
+VC_NOTIFY_DELAY = 300 # Seconds a channel needs 2+ people before the VC role is pinged
 VC_VERIFIED_EMPTY = set() # Tracks channels we have seen empty since restart
 LOG_CHANNEL_ID = None 
+PENDING_DELETES = {}      # {guild_id: [{'message', 'deleted_at', 'attempts'}]} waiting for the next audit log check
+DELETE_LOG_TASKS = {}     # {guild_id: asyncio.Task} the scheduled check for each guild
+AUDIT_LOG_WINDOW = 2.0    # Seconds of deletions that share one audit log fetch
+AUDIT_LOG_RETRIES = 1     # Extra checks for a deletion whose audit log entry hasn't shown up yet
 VC_IGNORE_CHANNELS = [] # List of ignored VC IDs
 
 # Global DB handler instance
 db = None
+POINT_JOURNAL = None # Journal of point deltas not yet merged into the database
+POINT_SEQ = 0        # Number of the last entry written to POINT_JOURNAL (the database remembers the last one it merged)
+STARTUP_DONE = False # on_ready fires again after every reconnect; the heavy setup only runs once
 
 
 # --- 4. DATABASE HANDLER (LOCAL FILE VERSION) ---
+def history_buckets(timestamp):
+    """Returns {period: bucket start} (UTC, weeks start on Monday) for a unix timestamp."""
+    hour_start = timestamp - timestamp % 3600
+    day_start = timestamp - timestamp % 86400
+    weekday = datetime.fromtimestamp(day_start, timezone.utc).weekday()
+    return {"hour": hour_start, "day": day_start, "week": day_start - weekday * 86400}
+
+
+class SqlitePointStore:
+    """
+    Keeps user_points in SQLite, keyed by (guild_id, group_key, user_id). Blocking: DatabaseHandler
+    only calls it through its single SQL thread.
+    """
+    def __init__(self, file_path, json_points):
+        self.conn = sqlite3.connect(file_path, check_same_thread=False) # Used from DatabaseHandler's SQL thread
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.execute("""CREATE TABLE IF NOT EXISTS user_points (
+                guild_id TEXT NOT NULL,
+                group_key TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                points INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (guild_id, group_key, user_id)
+            ) WITHOUT ROWID""")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_points_user ON user_points (guild_id, user_id)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._migrate_from_json(json_points)
+
+    def _migrate_from_json(self, json_points):
+        """Copies the points from database.json the first time the SQLite store is used."""
+        if self.conn.execute("SELECT 1 FROM meta WHERE key = 'migrated_json'").fetchone(): return
+        rows = [
+            (str(doc.get("guild_id")), doc.get("group_key"), str(doc.get("user_id")), int(doc.get("points", 0)))
+            for doc in json_points
+            if doc.get("guild_id") and doc.get("group_key") and doc.get("user_id")
+        ]
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO user_points VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (guild_id, group_key, user_id) DO UPDATE SET points = points + excluded.points", rows)
+            self.conn.execute("INSERT INTO meta VALUES ('migrated_json', ?)", (datetime.now(timezone.utc).isoformat(),))
+        print(f"Migrated {len(rows)} point entries from database.json to SQLite.")
+
+    def merge(self, rows, seq=None):
+        """Adds every (guild_id, group_key, user_id, points) row in a single transaction, along with the merged seq."""
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO user_points VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (guild_id, group_key, user_id) DO UPDATE SET points = points + excluded.points", rows)
+            if seq is not None:
+                self.conn.execute("INSERT INTO meta VALUES ('merged_seq', ?) ON CONFLICT (key) DO UPDATE SET value = excluded.value", (str(seq),))
+
+    def get_merged_seq(self):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'merged_seq'").fetchone()
+        return int(row[0]) if row else 0
+
+    def get_points(self, guild_id, group_key, user_id):
+        row = self.conn.execute(
+            "SELECT points FROM user_points WHERE guild_id = ? AND group_key = ? AND user_id = ?",
+            (guild_id, group_key, user_id)).fetchone()
+        return row[0] if row else 0
+
+    def get_all_group_points(self, guild_id, group_key):
+        cursor = self.conn.execute(
+            "SELECT user_id, points FROM user_points WHERE guild_id = ? AND group_key = ?", (guild_id, group_key))
+        return dict(cursor.fetchall())
+
+    def get_all_points(self):
+        """{(guild_id, group_key): {user_id: points}} for every stored row, in one query."""
+        results = {}
+        for guild_id, group_key, user_id, points in self.conn.execute("SELECT guild_id, group_key, user_id, points FROM user_points"):
+            results.setdefault((guild_id, group_key), {})[user_id] = points
+        return results
+
+    def get_user_points(self, guild_id, user_id):
+        cursor = self.conn.execute(
+            "SELECT group_key, points FROM user_points WHERE guild_id = ? AND user_id = ?", (guild_id, user_id))
+        return dict(cursor.fetchall())
+
+    def clear_group(self, guild_id, group_key):
+        with self.conn:
+            cursor = self.conn.execute("DELETE FROM user_points WHERE guild_id = ? AND group_key = ?", (guild_id, group_key))
+        return cursor.rowcount
+
+
+class PointHistoryStore:
+    """
+    Keeps points history in SQLite instead of the database.json journal. Merges only touch one
+    "hour" row per user; rollup() folds finished hours into "day" and "week" rows.
+    """
+    UPSERT = ("INSERT INTO points_history VALUES (?, ?, ?, ?, ?, ?) "
+              "ON CONFLICT (guild_id, group_key, period, start, user_id) DO UPDATE SET points = points + excluded.points")
+
+    def __init__(self, file_path, json_history):
+        self.conn = sqlite3.connect(file_path, check_same_thread=False) # Used from DatabaseHandler's SQL thread
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.execute("""CREATE TABLE IF NOT EXISTS points_history (
+                guild_id TEXT NOT NULL,
+                group_key TEXT NOT NULL,
+                period TEXT NOT NULL,
+                start INTEGER NOT NULL,
+                user_id TEXT NOT NULL,
+                points INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (guild_id, group_key, period, start, user_id)
+            ) WITHOUT ROWID""")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._migrate_from_json(json_history)
+
+    def _migrate_from_json(self, json_history):
+        """Copies history buckets that older versions kept in database.json."""
+        if not json_history or self.conn.execute("SELECT 1 FROM meta WHERE key = 'migrated_json_history'").fetchone(): return
+        rows = [
+            (str(doc.get("guild_id")), doc.get("group_key"), doc.get("period"), int(doc.get("start", 0)), str(doc.get("user_id")), int(doc.get("points", 0)))
+            for doc in json_history
+            if doc.get("guild_id") and doc.get("group_key") and doc.get("user_id") and doc.get("period")
+        ]
+        with self.conn:
+            self.conn.executemany(self.UPSERT, rows)
+            self.conn.execute("INSERT INTO meta VALUES ('migrated_json_history', ?)", (datetime.now(timezone.utc).isoformat(),))
+        print(f"Migrated {len(rows)} history buckets from database.json to SQLite.")
+
+    def add(self, rows, timestamp):
+        """Adds every (guild_id, group_key, user_id, points) row to the hour bucket of timestamp."""
+        hour = history_buckets(timestamp)["hour"]
+        with self.conn:
+            self.conn.executemany(self.UPSERT, [
+                (guild_id, group_key, "hour", hour, user_id, points) for guild_id, group_key, user_id, points in rows
+            ])
+
+    def get(self, guild_id, group_key, period, since):
+        """
+        Sums the period's buckets from since onwards into {user_id: points}. Hour rows not rolled up
+        yet are added in; they never overlap the day/week rows because rollup() deletes what it folds.
+        """
+        cursor = self.conn.execute(
+            "SELECT user_id, SUM(points) FROM points_history "
+            "WHERE guild_id = ? AND group_key = ? AND period IN (?, 'hour') AND start >= ? GROUP BY user_id",
+            (guild_id, group_key, period, since))
+        return dict(cursor.fetchall())
+
+    def rollup(self, now):
+        """Moves every hour bucket that ended before now into its day and week buckets."""
+        current = history_buckets(now)["hour"]
+        with self.conn:
+            hours = self.conn.execute(
+                "SELECT guild_id, group_key, start, user_id, points FROM points_history WHERE period = 'hour' AND start < ?",
+                (current,)).fetchall()
+            if not hours: return
+            rows = []
+            for guild_id, group_key, start, user_id, points in hours:
+                buckets = history_buckets(start)
+                rows.append((guild_id, group_key, "day", buckets["day"], user_id, points))
+                rows.append((guild_id, group_key, "week", buckets["week"], user_id, points))
+            self.conn.executemany(self.UPSERT, rows)
+            self.conn.execute("DELETE FROM points_history WHERE period = 'hour' AND start < ?", (current,))
+
+    def prune(self, cutoffs):
+        """Drops rolled-up buckets older than their cutoff, and bucket sizes no longer kept."""
+        with self.conn:
+            marks = ", ".join("?" * len(cutoffs))
+            self.conn.execute(f"DELETE FROM points_history WHERE period NOT IN ('hour', {marks})", list(cutoffs))
+            for period, cutoff in cutoffs.items():
+                self.conn.execute("DELETE FROM points_history WHERE period = ? AND start < ?", (period, cutoff))
+
+    def clear_group(self, guild_id, group_key):
+        with self.conn:
+            self.conn.execute("DELETE FROM points_history WHERE guild_id = ? AND group_key = ?", (guild_id, group_key))
+
+
 class DatabaseHandler:
     def __init__(self, uri, db_name):
         self.file_path = "database.json"
+        self.journal = Journal(self.file_path)
         self.data = self._load_from_file()
+        self.points_index = {} # {(guild_id, group_key): {user_id: doc}} over data["user_points"]
+        self._index_points()
+        self.rankings = {}     # {(guild_id, group_key): GroupRanking}, built the first time a group is asked for
+        self.next_prune = 0
+        # One thread for every SQLite call: commits stay off the event loop and still happen in order
+        self.sql_executor = ThreadPoolExecutor(max_workers=1)
+        self.points_store = None
+        if POINTS_BACKEND == "sqlite":
+            self.points_store = SqlitePointStore(POINTS_DB_FILE, self.data.get("user_points", []))
+        # History stays out of the journal: it changes for every active user on every merge
+        self.history = PointHistoryStore(POINTS_DB_FILE if self.points_store else HISTORY_DB_FILE, self.data.get("points_history"))
+        if "points_history" in self.data:
+            del self.data["points_history"]
+            self._save_to_file()
 
     def _load_from_file(self):
-        try:
-            with open(self.file_path, "r") as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {"bot_config": [], "sticky_messages": [], "user_points": []}
+        data = self.journal.read_snapshot({"bot_config": [], "sticky_messages": [], "user_points": []})
+        replay_ops(data, self.journal.read_ops())
+        return data
 
     def _save_to_file(self):
-        with open(self.file_path, "w") as f:
-            json.dump(self.data, f, indent=4, default=str)
+        """Writes the whole database as a fresh snapshot (the journal handles everyday saves)."""
+        self.journal.compact(self.data)
+
+    def _log(self, *ops):
+        """Appends changes to the journal instead of rewriting database.json."""
+        self.journal.append(*ops)
+        self.journal.maybe_compact(lambda: self.data)
+
+    async def _sql(self, fn, *args):
+        """Runs a blocking points_store/history call on the SQL thread."""
+        return await asyncio.get_running_loop().run_in_executor(self.sql_executor, fn, *args)
+
+    def _index_points(self):
+        self.points_index = {}
+        for doc in self.data.get("user_points", []):
+            group = self.points_index.setdefault((doc.get("guild_id"), doc.get("group_key")), {})
+            group[doc.get("user_id")] = doc
 
     async def load_config(self):
         collection = self.data.get("bot_config", [])
@@ -110,7 +370,7 @@ class DatabaseHandler:
         collection = [d for d in collection if d.get("_id") != "config"]
         collection.append(data_to_save)
         self.data["bot_config"] = collection
-        self._save_to_file()
+        self._log({"op": "put", "c": "bot_config", "doc": data_to_save})
 
     async def load_stickies(self):
         data = {}
@@ -131,62 +391,160 @@ class DatabaseHandler:
         collection = [d for d in collection if d.get("_id") != channel_id]
         collection.append(new_doc)
         self.data["sticky_messages"] = collection
-        self._save_to_file()
+        self._log({"op": "put", "c": "sticky_messages", "doc": new_doc})
 
     async def delete_sticky(self, channel_id):
         collection = self.data.get("sticky_messages", [])
         collection = [d for d in collection if d.get("_id") != channel_id]
         self.data["sticky_messages"] = collection
-        self._save_to_file()
+        self._log({"op": "del", "c": "sticky_messages", "match": {"_id": channel_id}})
 
     async def update_user_points(self, guild_id, group_key, user_id, points):
         user_id = str(user_id)
         guild_id = str(guild_id)
-        collection = self.data.get("user_points", [])
-        
-        found = False
-        for doc in collection:
-            if doc.get("guild_id") == guild_id and \
-               doc.get("group_key") == group_key and \
-               doc.get("user_id") == user_id:
-                doc["points"] = int(doc.get("points", 0)) + int(points)
-                found = True
-                break
-        
-        if not found:
-            new_doc = {
+        points = int(points)
+        # Manual awards/removals count towards this week/month too, so the period boards agree with all-time
+        await self._sql(self.history.add, [(guild_id, group_key, user_id, points)], int(time.time()))
+        if self.points_store:
+            def merge():
+                self.points_store.merge([(guild_id, group_key, user_id, points)])
+                return self.points_store.get_points(guild_id, group_key, user_id)
+            self._update_ranking(guild_id, group_key, {user_id: await self._sql(merge)})
+            return
+        found = self._add_points(guild_id, group_key, user_id, points)
+        self._update_ranking(guild_id, group_key, {user_id: found["points"]})
+        self._log({"op": "put", "c": "user_points", "key": ["guild_id", "group_key", "user_id"], "doc": found})
+
+    def _add_points(self, guild_id, group_key, user_id, points):
+        """Adds points to one stored doc (creating it if needed) and returns the doc."""
+        group = self.points_index.setdefault((guild_id, group_key), {})
+        found = group.get(user_id)
+        if found:
+            found["points"] = int(found.get("points", 0)) + int(points)
+        else:
+            found = {
                 "guild_id": guild_id,
                 "group_key": group_key,
                 "user_id": user_id,
                 "points": int(points)
             }
-            collection.append(new_doc)
-            
-        self.data["user_points"] = collection
-        self._save_to_file()
+            self.data.setdefault("user_points", []).append(found)
+            group[user_id] = found
+        return found
+
+    async def bulk_merge_points(self, point_cache, seq=None):
+        """
+        Adds a whole {guild_id: {group_key: {user_id: points}}} cache to the stored totals in one pass
+        and one save. seq (the last POINT_JOURNAL entry in the cache) is saved in that same write, so a
+        restart knows which pending entries are already in. Returns {(guild_id, group_key): {user_id: new_total}}
+        for every user that changed.
+        """
+        rows = [
+            (str(guild_id), group_key, str(user_id), int(points))
+            for guild_id, groups in point_cache.items()
+            for group_key, users in groups.items()
+            for user_id, points in users.items()
+            if points
+        ]
+        changed = {}
+        if self.points_store:
+            def merge():
+                self.points_store.merge(rows, seq)
+                for guild_id, group_key, user_id, _ in rows:
+                    changed.setdefault((guild_id, group_key), {})[user_id] = self.points_store.get_points(guild_id, group_key, user_id)
+            await self._sql(merge)
+        else:
+            ops = []
+            for guild_id, group_key, user_id, points in rows:
+                doc = self._add_points(guild_id, group_key, user_id, points)
+                changed.setdefault((guild_id, group_key), {})[user_id] = doc["points"]
+                ops.append({"op": "put", "c": "user_points", "key": ["guild_id", "group_key", "user_id"], "doc": doc})
+            if seq is not None:
+                self.data["points_merged_seq"] = seq
+                ops.append({"op": "set", "c": "points_merged_seq", "value": seq})
+            if ops: self._log(*ops)
+        # History goes second: a crash in between can only leave it short, never count points twice
+        await self._sql(self.history.add, rows, int(time.time()))
+
+        for (guild_id, group_key), totals in changed.items():
+            self._update_ranking(guild_id, group_key, totals)
+        return changed
+
+    def get_merged_seq(self):
+        """Number of the last POINT_JOURNAL entry already merged into the stored totals (only used at startup)."""
+        if self.points_store:
+            return self.sql_executor.submit(self.points_store.get_merged_seq).result()
+        return self.data.get("points_merged_seq", 0)
+
+    def _update_ranking(self, guild_id, group_key, totals):
+        """Moves only the users whose totals changed (groups nobody asked for yet are built later)."""
+        ranking = self.rankings.get((guild_id, group_key))
+        if ranking is None: return
+        for user_id, points in totals.items():
+            ranking.set(user_id, points)
+
+    async def get_period_points(self, guild_id, group_key, span):
+        """{user_id: points} earned this calendar week or month (UTC), from the precomputed buckets."""
+        if span == "week":
+            period, since = "week", history_buckets(int(time.time()))["week"]
+        else:
+            period, since = "day", int(datetime.now(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0).timestamp())
+        return await self._sql(self.history.get, str(guild_id), group_key, period, since)
+
+    async def prune_history(self):
+        """Rolls finished hours up and drops buckets older than HISTORY_RETENTION (at most once an hour)."""
+        now = int(time.time())
+        if now < self.next_prune: return
+        self.next_prune = now + 3600
+        def prune():
+            self.history.rollup(now)
+            self.history.prune({period: now - keep for period, keep in HISTORY_RETENTION.items()})
+        await self._sql(prune)
+
+    async def build_rankings(self):
+        """Builds every group's ranking in one pass over all points (used once at startup)."""
+        if self.points_store:
+            grouped = await self._sql(self.points_store.get_all_points)
+        else:
+            grouped = {key: {user_id: doc.get("points", 0) for user_id, doc in group.items()} for key, group in self.points_index.items()}
+        self.rankings = {key: GroupRanking(scores) for key, scores in grouped.items()}
+
+    async def get_group_ranking(self, guild_id, group_key):
+        key = (str(guild_id), group_key)
+        if key not in self.rankings:
+            self.rankings[key] = GroupRanking(await self.get_all_group_points(guild_id, group_key))
+        return self.rankings[key]
 
     async def get_all_group_points(self, guild_id, group_key):
         guild_id = str(guild_id)
-        collection = self.data.get("user_points", [])
-        results = {}
-        for doc in collection:
-            if doc.get("guild_id") == guild_id and doc.get("group_key") == group_key:
-                results[doc["user_id"]] = doc.get("points", 0)
-        return results
+        if self.points_store:
+            return await self._sql(self.points_store.get_all_group_points, guild_id, group_key)
+        group = self.points_index.get((guild_id, group_key), {})
+        return {user_id: doc.get("points", 0) for user_id, doc in group.items()}
 
     async def get_user_points(self, guild_id, user_id):
         """Retrieves points for a single user across all groups."""
         guild_id = str(guild_id)
         user_id = str(user_id)
-        collection = self.data.get("user_points", [])
+        if self.points_store:
+            return await self._sql(self.points_store.get_user_points, guild_id, user_id)
         results = {}
-        for doc in collection:
-            if doc.get("guild_id") == guild_id and doc.get("user_id") == user_id:
-                results[doc["group_key"]] = int(doc.get("points", 0))
+        for (doc_guild, group_key), group in self.points_index.items():
+            if doc_guild == guild_id and user_id in group:
+                results[group_key] = int(group[user_id].get("points", 0))
         return results
 
     async def clear_points_by_group(self, guild_id, group_key):
         guild_id = str(guild_id)
+        self.rankings.pop((guild_id, group_key), None)
+        if self.points_store:
+            def clear():
+                self.history.clear_group(guild_id, group_key)
+                return self.points_store.clear_group(guild_id, group_key)
+            deleted = await self._sql(clear)
+            # A ranking built while the clear was queued still has the old totals
+            self.rankings.pop((guild_id, group_key), None)
+            return deleted
         collection = self.data.get("user_points", [])
         initial_count = len(collection)
         
@@ -196,7 +554,9 @@ class DatabaseHandler:
         ]
         
         self.data["user_points"] = new_collection
-        self._save_to_file()
+        self.points_index.pop((guild_id, group_key), None)
+        self._log({"op": "del", "c": "user_points", "match": {"guild_id": guild_id, "group_key": group_key}})
+        await self._sql(self.history.clear_group, guild_id, group_key)
         return initial_count - len(new_collection)
 
 # --- 5. CONFIGURATION LOADING ---
@@ -236,6 +596,8 @@ async def load_initial_config():
         ADMIN_ROLE_IDS = admin_data
     else:
         ADMIN_ROLE_IDS = []
+
+    rebuild_category_index()
     
     print("Configuration loaded from MongoDB.")
 
@@ -257,6 +619,7 @@ async def save_config_to_db():
 
 def add_points_to_cache(user_id, guild_id, group_key, points):
     """Adds points to the in-memory cache for periodic saving. Uses integers only."""
+    global POINT_SEQ
     user_id = str(user_id)
     guild_id = str(guild_id)
     
@@ -267,26 +630,177 @@ def add_points_to_cache(user_id, guild_id, group_key, points):
         
     current = POINT_CACHE[guild_id][group_key].get(user_id, 0)
     POINT_CACHE[guild_id][group_key][user_id] = current + int(points) 
-
+    if POINT_JOURNAL:
+        POINT_SEQ += 1
+        POINT_JOURNAL.append({"op": "add", "g": guild_id, "k": group_key, "u": user_id, "p": int(points), "n": POINT_SEQ})
+
+
+def replay_pending_points(journal):
+    """
+    Puts points that were earned but not saved before a restart back into POINT_CACHE. Entries the
+    database already merged (a crash between the merge and clearing the journal) are skipped.
+    Nothing is touched until the whole journal has been read, so a failed replay can simply be retried.
+    """
+    global POINT_SEQ
+    merged_seq = db.get_merged_seq()
+    last_seq = max(journal.read_snapshot({}).get("seq", 0), merged_seq)
+    recovered = {}
+    count = 0
+    for op in journal.read_ops():
+        seq = op.get("n")
+        if seq is not None:
+            last_seq = max(last_seq, seq)
+            if seq <= merged_seq: continue
+        if op.get("op") == "add":
+            users = recovered.setdefault(op["g"], {}).setdefault(op["k"], {})
+            users[op["u"]] = users.get(op["u"], 0) + int(op["p"])
+            count += 1
+        elif op.get("op") == "clear":
+            recovered.get(op["g"], {}).pop(op["k"], None)
+
+    for guild_id, groups in recovered.items():
+        for group_key, users in groups.items():
+            cached = POINT_CACHE.setdefault(guild_id, {}).setdefault(group_key, {})
+            for user_id, points in users.items():
+                cached[user_id] = cached.get(user_id, 0) + points
+    POINT_SEQ = max(POINT_SEQ, last_seq)
+    if count:
+        print(f"Recovered {count} unsaved point entries from the last run.")
+
+
+def rebuild_category_index():
+    """Rebuilds the category -> group lookup. Call after anything changes a group's categories."""
+    CATEGORY_GROUPS.clear()
+    for group_key, group_data in LEADERBOARD_GROUPS.items():
+        for cat_id in group_data['categories']:
+            CATEGORY_GROUPS.setdefault(cat_id, group_key)
+    CHANNEL_GROUPS.clear()
 
 def is_category_tracked(channel):
     """Checks if a channel's category is in a tracked group and returns the group key (e.g., 'Group1')."""
-    if not channel.category:
-        return None
-    cat_id = channel.category.id
-    
-    for group_key, group_data in LEADERBOARD_GROUPS.items():
-        if cat_id in group_data['categories']:
-            return group_key
-    return None
+    if channel.id in CHANNEL_GROUPS:
+        return CHANNEL_GROUPS[channel.id]
+    group_key = CATEGORY_GROUPS.get(channel.category.id) if channel.category else None
+    CHANNEL_GROUPS[channel.id] = group_key
+    return group_key
+
+def credit_voice_time(user_id, now):
+    """Pays a user for the eligible voice time since their last credit (leftover seconds carry over)."""
+    data = VOICE_TRACKER.get(user_id)
+    if not data or data['since'] is None:
+        return
+    elapsed = data['carry'] + now - data['since']
+    units = int(elapsed // VOICE_UNIT_SECONDS)
+    data['carry'] = elapsed - units * VOICE_UNIT_SECONDS
+    data['since'] = now
+    if units:
+        add_points_to_cache(int(user_id), data['guild_id'], data['group'], units * POINT_VALUES['voice_interval'])
+
+def _update_voice_eligibility(channel_id, now):
+    """Starts or stops the clock for everyone in a channel (voice points need 2+ people)."""
+    humans = VOICE_CHANNEL_HUMANS.get(channel_id, set())
+    eligible = len(humans) >= 2
+    for user_id in humans:
+        data = VOICE_TRACKER.get(user_id)
+        if not data:
+            continue
+        if eligible and data['since'] is None:
+            data['since'] = now
+        elif not eligible and data['since'] is not None:
+            credit_voice_time(user_id, now)
+            data['since'] = None
+
+def rebuild_voice_state():
+    """Reads who is in voice right now (on startup/reconnect), paying out anything already tracked first."""
+    now = time.time()
+    for user_id in list(VOICE_TRACKER):
+        credit_voice_time(user_id, now)
+    VOICE_TRACKER.clear()
+    VOICE_CHANNEL_HUMANS.clear()
+    for guild in bot.guilds:
+        for vc in guild.voice_channels:
+            humans = {str(m.id) for m in vc.members if not m.bot}
+            if humans:
+                VOICE_CHANNEL_HUMANS[vc.id] = humans
+                group_key = is_category_tracked(vc)
+                if group_key:
+                    for user_id in humans:
+                        VOICE_TRACKER[user_id] = {'group': group_key, 'guild_id': guild.id, 'since': None, 'carry': 0.0}
+                _update_voice_eligibility(vc.id, now)
+            # Empty channels are marked safe to notify; busy ones start or drop their timer to match
+            _update_vc_notify(vc.id, now)
+
+def _update_vc_notify(channel_id, now):
+    """
+    Runs when a channel's head count changes. The notify timer starts when 2+ people are in a channel
+    and is cancelled as soon as fewer than 2 are left; the next time 2 are together it starts over.
+    """
+    count = len(VOICE_CHANNEL_HUMANS.get(channel_id, ()))
+
+    # CLEANUP: If empty, remove state AND mark as verified empty (safe to ping later).
+    if count == 0:
+        VC_VERIFIED_EMPTY.add(channel_id)
+        state = VC_ACTIVE_STATE.pop(channel_id, None)
+        if state and state['timer']:
+            state['timer'].cancel()
+        return
+
+    # Channels that were already busy when the bot started are skipped until they empty (no restart-pings)
+    if not VC_NOTIFY_ROLE_ID or channel_id not in VC_VERIFIED_EMPTY or channel_id in VC_IGNORE_CHANNELS:
+        return
+
+    state = VC_ACTIVE_STATE.setdefault(channel_id, {'start_time': None, 'pinged': False, 'timer': None, 'due': False})
+    if count < 2:
+        if state['timer']:
+            state['timer'].cancel()
+        state['timer'] = None
+        state['start_time'] = None
+        return
+    if state['pinged']:
+        return
+
+    if state['due']:
+        asyncio.create_task(_ping_vc_role(channel_id))
+    elif state['start_time'] is None:
+        state['start_time'] = now
+        state['timer'] = asyncio.get_running_loop().call_later(VC_NOTIFY_DELAY, _vc_notify_timer_done, channel_id)
+
+def _vc_notify_timer_done(channel_id):
+    state = VC_ACTIVE_STATE.get(channel_id)
+    if not state:
+        return
+    state['timer'] = None
+    asyncio.create_task(_ping_vc_role(channel_id))
+
+async def _ping_vc_role(channel_id):
+    state = VC_ACTIVE_STATE.get(channel_id)
+    vc = bot.get_channel(channel_id)
+    if not state or state['pinged'] or not vc or not VC_NOTIFY_ROLE_ID:
+        return
+    role = vc.guild.get_role(VC_NOTIFY_ROLE_ID)
+    if not role:
+        return
+    state['pinged'] = True
+    try:
+        await submit(lambda: vc.send(role.mention), PRIORITY_INTERACTIVE, route=("channel", vc.id))
+    except Exception as e:
+        state['pinged'] = False
+        state['due'] = True # Try again the next time the head count changes
+        print(f"Error pinging role in VC {vc.name}: {e}")
 
-async def _create_leaderboard_embed(guild, group_key):
-    """Helper function to create the leaderboard embed based on the cache."""
+async def _create_leaderboard_embed(guild, group_key, span=None):
+    """Helper function to create the leaderboard embed based on the cache (or this week's/month's buckets)."""
     guild_id = str(guild.id)
     group_name = LEADERBOARD_GROUPS.get(group_key, {}).get('name', 'Unknown Group')
-    cache_data = LEADERBOARD_CACHE.get(guild_id, {}).get(group_key, {})
-    top_users = cache_data.get('top_users', [])
-    updated_time_unix = cache_data.get('updated', 'N/A')
+    if span:
+        period_points = await db.get_period_points(guild_id, group_key, span)
+        top_users = heapq.nlargest(20, period_points.items(), key=lambda item: item[1])
+        updated_time_unix = int(datetime.now(timezone.utc).timestamp())
+        group_name = f"{group_name} (This {span.capitalize()})"
+    else:
+        cache_data = LEADERBOARD_CACHE.get(guild_id, {}).get(group_key, {})
+        top_users = cache_data.get('top_users', [])
+        updated_time_unix = cache_data.get('updated', 'N/A')
 
     embed = discord.Embed(
         title=f"🏆 {guild.name} - {group_name}",
@@ -299,38 +813,86 @@ async def _create_leaderboard_embed(guild, group_key):
     
     if not top_users:
         embed.description = leaderboard_text + "🥺 No points recorded yet."
-        embed.set_footer(text=f"Refreshes every 5 minutes")
+        embed.set_footer(text=f"Refreshes every {POINT_SAVE_INTERVAL // 60} minutes")
         return embed
         
+    names = await resolve_display_names([user_id_str for user_id_str, _ in top_users])
     for rank, (user_id_str, points) in enumerate(top_users, 1):
-        try:
-            user = bot.get_user(int(user_id_str)) or await bot.fetch_user(int(user_id_str))
-            display_name = user.display_name if user else "[User Left]" 
-            emoji = {1: "🥇", 2: "🥈", 3: "🥉"}.get(rank, f"**#{rank}**")
-            leaderboard_text += f"{emoji} **{display_name}**: {int(points)} Points\n"
-        except discord.NotFound:
+        display_name = names.get(user_id_str)
+        if display_name is None:
             leaderboard_text += f"**#{rank}** **[User Left]**: {int(points)} Points\n"
+            continue
+        emoji = {1: "🥇", 2: "🥈", 3: "🥉"}.get(rank, f"**#{rank}**")
+        leaderboard_text += f"{emoji} **{display_name}**: {int(points)} Points\n"
 
     embed.description = leaderboard_text
-    embed.set_footer(text=f"Refreshes every 5 minutes")
+    embed.set_footer(text=f"Refreshes every {POINT_SAVE_INTERVAL // 60} minutes")
     return embed
 
+def remember_display_name(user_id, display_name):
+    """Stores a name (None = user no longer exists) and drops the least recently used ones past the limit."""
+    user_id = str(user_id)
+    DISPLAY_NAME_CACHE[user_id] = (display_name, time.time() + NAME_CACHE_TTL)
+    DISPLAY_NAME_CACHE.move_to_end(user_id)
+    while len(DISPLAY_NAME_CACHE) > NAME_CACHE_SIZE:
+        DISPLAY_NAME_CACHE.popitem(last=False)
+
+async def resolve_display_names(user_ids):
+    """
+    Returns {user_id: display name or None}. Unknown users are fetched in parallel (a few at a time).
+    None (and a cached None) only means Discord said the user is gone; any other error shows the ID for now.
+    """
+    now = time.time()
+    names = {}
+    missing = []
+    for user_id in user_ids:
+        entry = DISPLAY_NAME_CACHE.get(user_id)
+        if entry and entry[1] > now:
+            DISPLAY_NAME_CACHE.move_to_end(user_id)
+            names[user_id] = entry[0]
+            continue
+        user = bot.get_user(int(user_id))
+        if user:
+            remember_display_name(user_id, user.display_name)
+            names[user_id] = user.display_name
+        else:
+            missing.append(user_id)
+
+    if missing:
+        limit = asyncio.Semaphore(NAME_FETCH_CONCURRENCY)
+
+        async def fetch(user_id):
+            async with limit:
+                try:
+                    user = await bot.fetch_user(int(user_id))
+                    remember_display_name(user_id, user.display_name)
+                    names[user_id] = user.display_name
+                except discord.NotFound:
+                    remember_display_name(user_id, None)
+                    names[user_id] = None
+                except Exception as e:
+                    # Rate limit, timeout, outage...: not cached, so the next refresh tries again
+                    print(f"Could not look up user {user_id}: {e}")
+                    names[user_id] = user_id
+
+        await asyncio.gather(*(fetch(user_id) for user_id in missing))
+    return names
+
 async def refresh_group_leaderboard(guild, group_key):
     """Refreshes the leaderboard cache and permanent message for a specific group immediately."""
     guild_id = str(guild.id)
     
-    # 1. Fetch latest data from DB
-    leader_data = await db.get_all_group_points(guild_id, group_key)
+    # 1. Read the latest ranking
+    ranking = await db.get_group_ranking(guild_id, group_key)
     current_unix_timestamp = int(datetime.now(timezone.utc).timestamp())
     
     if guild_id not in LEADERBOARD_CACHE:
         LEADERBOARD_CACHE[guild_id] = {}
         
-    if leader_data:
-        sorted_users = sorted(leader_data.items(), key=lambda item: item[1], reverse=True)
+    if ranking:
         LEADERBOARD_CACHE[guild_id][group_key] = {
             'updated': current_unix_timestamp, 
-            'top_users': sorted_users[:20]  # Show Top 20
+            'top_users': ranking.top(20)  # Show Top 20
         }
     else:
         LEADERBOARD_CACHE[guild_id][group_key] = {
@@ -340,16 +902,164 @@ async def refresh_group_leaderboard(guild, group_key):
         
     # 2. Update Permanent Message if it exists
     if group_key in PERMANENT_LEADERBOARDS:
-        data = PERMANENT_LEADERBOARDS[group_key]
         try:
-            channel = bot.get_channel(data['channel_id'])
-            if channel and channel.guild:
-                message = await channel.fetch_message(data['message_id'])
-                new_embed = await _create_leaderboard_embed(channel.guild, group_key)
-                await message.edit(embed=new_embed)
+            await update_permanent_leaderboard(group_key)
         except Exception as e:
             print(f"Error immediate update for {group_key}: {e}")
 
+def _embed_fingerprint(embed):
+    """Hash of what the embed shows, ignoring the 'As of' timestamp line."""
+    data = embed.to_dict()
+    data['description'] = data.get('description', '').split('\n\n', 1)[-1]
+    return hashlib.sha1(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+async def update_permanent_leaderboard(group_key):
+    """
+    Edits a permanent leaderboard message only if its content changed. The message handle is cached
+    as a partial message, so a needed update is a single edit with no fetch first.
+    Returns True if the message was edited. Raises discord.NotFound if the message is gone.
+    """
+    data = PERMANENT_LEADERBOARDS[group_key]
+    channel = bot.get_channel(data['channel_id'])
+    if not channel or not channel.guild:
+        print(f"Warning: Permanent Leaderboard Channel ID {data['channel_id']} not found or bot left guild.")
+        return False
+
+    state = PERMANENT_MESSAGE_STATE.get(group_key)
+    if not state or state['message'].id != data['message_id'] or state['message'].channel.id != channel.id:
+        state = {'message': channel.get_partial_message(data['message_id']), 'fingerprint': None}
+        PERMANENT_MESSAGE_STATE[group_key] = state
+
+    new_embed = await _create_leaderboard_embed(channel.guild, group_key)
+    fingerprint = _embed_fingerprint(new_embed)
+    if fingerprint == state['fingerprint']:
+        return False
+
+    # Keyed by message, so a refresh still waiting in the queue is replaced by this newer one
+    await submit(lambda: state['message'].edit(embed=new_embed), PRIORITY_BACKGROUND,
+                 route=("channel", channel.id), key=("edit", data['message_id']))
+    state['fingerprint'] = fingerprint
+    return True
+
+def _schedule_delete_logs(guild):
+    """Makes sure one audit log check is coming up for this guild."""
+    task = DELETE_LOG_TASKS.get(guild.id)
+    if task is None or task.done():
+        DELETE_LOG_TASKS[guild.id] = asyncio.create_task(_process_delete_logs(guild))
+
+async def _process_delete_logs(guild):
+    """Resolves every queued deletion against a single audit log fetch, then logs them in batches."""
+    await asyncio.sleep(AUDIT_LOG_WINDOW)
+    pending = PENDING_DELETES.pop(guild.id, [])
+    if not pending:
+        return
+
+    # 1. Determine who deleted each message (one fetch covers the whole window)
+    entries = []
+    if pending:
+        try:
+            async for entry in guild.audit_logs(limit=50, action=discord.AuditLogAction.message_delete):
+                entries.append(entry)
+        except Exception as e:
+            print(f"Error checking audit logs: {e}")
+
+    embeds = []
+    retry = []
+    for item in pending:
+        message = item['message']
+        deleter = find_deleter(entries, message, item['deleted_at'])
+
+        if deleter is None:
+            # The entry can show up a little late, so give it another window before blaming the author
+            if item['attempts'] < AUDIT_LOG_RETRIES:
+                item['attempts'] += 1
+                retry.append(item)
+                continue
+            # If no audit log, it's likely the author themselves
+            deleter = message.author
+
+        # 2. FINAL CHECK: If the person who deleted it is an Admin, DO NOT LOG.
+        member = deleter if isinstance(deleter, discord.Member) else guild.get_member(deleter.id)
+        if member and is_user_admin(member):
+            continue
+
+        embeds.append(_build_delete_embed(message, deleter))
+
+    if retry:
+        PENDING_DELETES.setdefault(guild.id, [])[:0] = retry
+
+    # 3. Send up to 10 embeds per message
+    log_channel = bot.get_channel(LOG_CHANNEL_ID)
+    if log_channel:
+        for i in range(0, len(embeds), 10):
+            try:
+                await submit(lambda batch=embeds[i:i + 10]: log_channel.send(embeds=batch), PRIORITY_LOG, route=("channel", log_channel.id))
+            except Exception as e:
+                print(f"Error sending delete logs: {e}")
+
+    # Retries and anything deleted while we were busy get the next window
+    if PENDING_DELETES.get(guild.id):
+        DELETE_LOG_TASKS[guild.id] = asyncio.create_task(_process_delete_logs(guild))
+
+def _build_delete_embed(message, deleter):
+    embed = discord.Embed(
+        description=(
+            f"**Author:** {message.author.mention}\n"
+            f"**Deleted By:** {deleter.mention}\n"
+            f"**Channel:** {message.channel.mention}\n"
+            f"**Message:** {message.content if message.content else '*[No Text Content]*'}"
+        ),
+        color=discord.Color.red(),
+        timestamp=datetime.now(timezone.utc)
+    )
+    
+    if message.attachments:
+        att_list = "\n".join([f"[{a.filename}]({a.url})" for a in message.attachments])
+        embed.add_field(name="Attachments", value=att_list, inline=False)
+    return embed
+
+async def _send_bulk_delete_log(channel, messages, total, uncached=0):
+    """Logs a purge as one embed with per-author counts, plus every message in an attached text file."""
+    log_channel = bot.get_channel(LOG_CHANNEL_ID)
+    if not log_channel:
+        return
+
+    author_counts = {}
+    lines = []
+    for message in sorted(messages, key=lambda m: m.created_at):
+        author_counts[message.author] = author_counts.get(message.author, 0) + 1
+        line = f"[{message.created_at.strftime('%Y-%m-%d %H:%M:%S')}] {message.author} ({message.author.id}): {message.content}"
+        if message.attachments:
+            line += " " + " ".join(a.url for a in message.attachments)
+        lines.append(line)
+
+    top_authors = sorted(author_counts.items(), key=lambda item: item[1], reverse=True)
+    summary = "\n".join(f"{author.mention}: {count}" for author, count in top_authors[:20])
+    if len(top_authors) > 20:
+        summary += f"\n...and {len(top_authors) - 20} more"
+
+    embed = discord.Embed(
+        title="🧹 Bulk Delete",
+        description=(
+            f"**Channel:** {channel.mention if channel else 'Unknown'}\n"
+            f"**Messages Deleted:** {total}"
+            + (f" ({uncached} not in cache)" if uncached > 0 else "")
+        ),
+        color=discord.Color.red(),
+        timestamp=datetime.now(timezone.utc)
+    )
+    if summary:
+        embed.add_field(name="By Author", value=summary, inline=False)
+
+    try:
+        if lines:
+            file = discord.File(io.BytesIO("\n".join(lines).encode()), filename=f"deleted_messages_{channel.id if channel else 'unknown'}.txt")
+            await submit(lambda: log_channel.send(embed=embed, file=file), PRIORITY_LOG, route=("channel", log_channel.id))
+        else:
+            await submit(lambda: log_channel.send(embed=embed), PRIORITY_LOG, route=("channel", log_channel.id))
+    except Exception as e:
+        print(f"Error sending bulk delete log: {e}")
+
 # --- Custom Check for Admins or Permitted Roles ---
 
 def is_user_admin(member):
@@ -375,18 +1085,38 @@ def check_admin_perms():
 @bot.event
 async def on_ready():
     """Handles MongoDB connection and starts tasks."""
-    global db, LEADERBOARD_CACHE
+    global db, LEADERBOARD_CACHE, POINT_JOURNAL, STARTUP_DONE
+
+    if STARTUP_DONE:
+        # Reconnect: everything in memory is still good, only voice channels may have changed meanwhile
+        print(f"Reconnected as {bot.user}.")
+        rebuild_voice_state()
+        return
     
     try:
-        print(f"Attempting to connect to MongoDB...")
-        db = DatabaseHandler("", DB_NAME)
-        print("Successfully connected to MongoDB!")
+        # Each step below only happens once, even if a later one fails and on_ready runs the rest again
+        if db is None:
+            print(f"Attempting to connect to MongoDB...")
+            db = DatabaseHandler("", DB_NAME)
+            print("Successfully connected to MongoDB!")
+
+        if POINT_JOURNAL is None:
+            journal = Journal(PENDING_POINTS_FILE, fsync=True)
+            replay_pending_points(journal)
+            POINT_JOURNAL = journal
 
         await load_initial_config()
+
+        # Warm the display name cache from the member lists we already have
+        for guild in bot.guilds:
+            for member in guild.members:
+                # Leaderboards show the account's name, not the server nickname
+                remember_display_name(member.id, member.global_name or member.name)
         
         # --- REFRESH CACHE IMMEDIATELY ---
         print("Performing initial leaderboard cache refresh for Top 20...")
         current_unix_timestamp = int(datetime.now(timezone.utc).timestamp())
+        await db.build_rankings()
         
         for guild in bot.guilds:
             guild_id = str(guild.id)
@@ -394,12 +1124,11 @@ async def on_ready():
                 LEADERBOARD_CACHE[guild_id] = {}
 
             for group_key in LEADERBOARD_GROUPS:
-                leader_data = await db.get_all_group_points(guild_id, group_key)
-                if leader_data:
-                    sorted_users = sorted(leader_data.items(), key=lambda item: item[1], reverse=True)
+                ranking = await db.get_group_ranking(guild_id, group_key)
+                if ranking:
                     LEADERBOARD_CACHE[guild_id][group_key] = {
                         'updated': current_unix_timestamp, 
-                        'top_users': sorted_users[:20] 
+                        'top_users': ranking.top(20) 
                     }
                 else:
                     LEADERBOARD_CACHE[guild_id][group_key] = {
@@ -414,25 +1143,33 @@ async def on_ready():
         return
 
     print(f'Hello! I am logged in as {bot.user} with prefix "{PREFIX}"')
-    voice_time_checker.start() 
-    
-    # Logic to align point_saver to clean 5-minute intervals
-    now = datetime.now()
-    current_total_seconds = now.minute * 60 + now.second
-    seconds_past_last_5_min_mark = current_total_seconds % 300
-    wait_time = 300 - seconds_past_last_5_min_mark
-    
-    if wait_time == 300:
-        wait_time = 0
-
-    if wait_time > 0:
-        print(f"Waiting {wait_time} seconds to align point_saver to the next clean 5-minute mark...")
-        await asyncio.sleep(wait_time)
+    STARTUP_DONE = True
+    rebuild_voice_state()
     
-    point_saver.change_interval(seconds=300) 
-    point_saver.start() 
+    # point_saver lines itself up with the clock (POINT_SAVE_TIMES), so no waiting here
+    if not point_saver.is_running():
+        point_saver.start() 
     print("Background tasks started.")
 
+@bot.event
+async def on_member_join(member):
+    remember_display_name(member.id, member.global_name or member.name)
+
+@bot.event
+async def on_user_update(before, after):
+    if before.display_name != after.display_name:
+        remember_display_name(after.id, after.display_name)
+
+@bot.event
+async def on_guild_channel_update(before, after):
+    # Moving a channel to another category can change its group (and its threads' groups), which is rare enough to just start over
+    if before.category_id != after.category_id:
+        CHANNEL_GROUPS.clear()
+
+@bot.event
+async def on_guild_channel_delete(channel):
+    CHANNEL_GROUPS.pop(channel.id, None)
+
 @bot.event
 async def on_message(message):
     """Runs whenever a user sends a message or attachment."""
@@ -452,54 +1189,28 @@ async def on_message(message):
 
 @bot.event
 async def on_message_delete(message):
-    """Runs when a message is deleted and logs it if a log channel is set."""
-    if message.author.bot:
+    """Runs when a message is deleted and queues it for logging if a log channel is set."""
+    if message.author.bot or not message.guild:
         return
         
     if LOG_CHANNEL_ID:
-        # 1. Determine who deleted the message
-        deleter = None
-        
-        # Try to find the audit log entry
-        try:
-            # We fetch a few logs to be safe
-            async for entry in message.guild.audit_logs(limit=6, action=discord.AuditLogAction.message_delete):
-                # Target of the deletion is the author of the message
-                if entry.target.id == message.author.id and entry.extra.channel.id == message.channel.id:
-                    # Check timestamp roughly (within 20s)
-                    if (datetime.now(timezone.utc) - entry.created_at).total_seconds() < 20:
-                        deleter = entry.user
-                        break
-        except Exception as e:
-            print(f"Error checking audit logs: {e}")
+        # Deletions are matched against one audit log fetch per guild per AUDIT_LOG_WINDOW
+        PENDING_DELETES.setdefault(message.guild.id, []).append({
+            'message': message,
+            'deleted_at': datetime.now(timezone.utc),
+            'attempts': 0
+        })
+        _schedule_delete_logs(message.guild)
 
-        # If no audit log, it's likely the author themselves
-        if deleter is None:
-            deleter = message.author
 
-        # 2. FINAL CHECK: If the person who deleted it is an Admin, DO NOT LOG.
-        if is_user_admin(deleter):
-            return 
-
-        # 3. Log format
-        log_channel = bot.get_channel(LOG_CHANNEL_ID)
-        if log_channel:
-            embed = discord.Embed(
-                description=(
-                    f"**Author:** {message.author.mention}\n"
-                    f"**Deleted By:** {deleter.mention}\n"
-                    f"**Channel:** {message.channel.mention}\n"
-                    f"**Message:** {message.content if message.content else '*[No Text Content]*'}"
-                ),
-                color=discord.Color.red(),
-                timestamp=datetime.now(timezone.utc)
-            )
-            
-            if message.attachments:
-                att_list = "\n".join([f"[{a.filename}]({a.url})" for a in message.attachments])
-                embed.add_field(name="Attachments", value=att_list, inline=False)
-                
-            await log_channel.send(embed=embed)
+@bot.event
+async def on_raw_bulk_message_delete(payload):
+    """Runs for purges (one event for many messages). Logs them as a single summary."""
+    if not LOG_CHANNEL_ID or not payload.guild_id:
+        return
+    channel = bot.get_channel(payload.channel_id)
+    messages = [m for m in payload.cached_messages if not m.author.bot]
+    await _send_bulk_delete_log(channel, messages, len(payload.message_ids), len(payload.message_ids) - len(payload.cached_messages))
 
 
 @bot.event
@@ -525,113 +1236,61 @@ async def on_voice_state_update(member, before, after):
     
     if member.bot:
         return
-    
-    group_key_after = is_category_tracked(after.channel) if after.channel else None
-
-    if group_key_after and user_id not in VOICE_TRACKER:
-        VOICE_TRACKER[user_id] = {'time': time.time(), 'group': group_key_after}
-        
-    elif user_id in VOICE_TRACKER and not group_key_after:
-        del VOICE_TRACKER[user_id] 
 
-# --- 8. TASKS (Background Jobs) ---
-
-@tasks.loop(seconds=30.0) 
-async def voice_time_checker():
-    """Awards points for voice time and checks for VC notification."""
-    current_time = time.time()
-    
-    # --- PART 1: POINT AWARDING ---
-    for user_id_str, data in list(VOICE_TRACKER.items()): 
-        join_time = data['time']
-        group_key = data['group']
-            
-        time_diff = current_time - join_time 
-        
-        if time_diff >= 30.0:
-            guild = bot.get_guild(data.get('guild_id'))
-            member = guild.get_member(int(user_id_str)) if guild else None
+    # Mute/deafen/stream changes don't move anyone
+    before_id = before.channel.id if before.channel else None
+    after_id = after.channel.id if after.channel else None
+    if before_id == after_id:
+        return
 
-            if member and member.voice and member.voice.channel:
-                vc = member.voice.channel
-                non_bot_users = sum(1 for m in vc.members if not m.bot)
-                
-                if non_bot_users >= 2:
-                    points_earned = POINT_VALUES['voice_interval'] 
-                    add_points_to_cache(int(user_id_str), guild.id, group_key, points_earned)
-                
-                VOICE_TRACKER[user_id_str]['time'] = current_time 
-            
-    # --- PART 2: VC NOTIFICATION LOGIC ---
-    if VC_NOTIFY_ROLE_ID:
-        for guild in bot.guilds:
-            role = guild.get_role(VC_NOTIFY_ROLE_ID)
-            if not role:
-                continue
-
-            for vc in guild.voice_channels:
-                non_bot_members = [m for m in vc.members if not m.bot]
-                
-                # CLEANUP: If empty, remove state AND mark as verified empty (safe to ping later).
-                # This ensures the timer completely resets ONLY when the channel goes empty.
-                if len(non_bot_members) == 0:
-                    VC_VERIFIED_EMPTY.add(vc.id)
-                    if vc.id in VC_ACTIVE_STATE:
-                        del VC_ACTIVE_STATE[vc.id]
-                    continue
-                
-                # If we haven't seen this channel empty since the bot started, 
-                # we assume it's a pre-existing session and skip tracking to avoid restart-pings.
-                if vc.id not in VC_VERIFIED_EMPTY:
-                    continue
-
-                # If channel is ignored, skip notification logic
-                if vc.id in VC_IGNORE_CHANNELS:
-                    continue
-
-                # INITIALIZE STATE
-                if vc.id not in VC_ACTIVE_STATE:
-                    VC_ACTIVE_STATE[vc.id] = {'start_time': None, 'pinged': False}
-                
-                state = VC_ACTIVE_STATE[vc.id]
-                
-                # If we already pinged, do NOT ping again (unless state was cleared by emptiness)
-                if state['pinged']:
-                    continue
-
-                if len(non_bot_members) >= 2:
-                    # Condition Met: Start/Check Timer
-                    if state['start_time'] is None:
-                        state['start_time'] = current_time
-                    
-                    elapsed = current_time - state['start_time']
-                    if elapsed >= 300:
-                        try:
-                            await vc.send(role.mention)
-                            state['pinged'] = True
-                        except Exception as e:
-                            print(f"Error pinging role in VC {vc.name}: {e}")
-                else:
-                    # Condition Broken (len=1), but not Empty.
-                    pass
+    # Pay everyone in the affected channels up to now, before the head count changes
+    now = time.time()
+    affected = [channel_id for channel_id in (before_id, after_id) if channel_id]
+    for channel_id in affected:
+        for other_id in VOICE_CHANNEL_HUMANS.get(channel_id, ()):
+            credit_voice_time(other_id, now)
+
+    if before_id:
+        humans = VOICE_CHANNEL_HUMANS.get(before_id, set())
+        humans.discard(user_id)
+        if not humans:
+            VOICE_CHANNEL_HUMANS.pop(before_id, None)
+    old_data = VOICE_TRACKER.pop(user_id, None)
+
+    if after_id:
+        VOICE_CHANNEL_HUMANS.setdefault(after_id, set()).add(user_id)
+        group_key_after = is_category_tracked(after.channel)
+        if group_key_after:
+            carry = old_data['carry'] if old_data and old_data['group'] == group_key_after else 0.0
+            VOICE_TRACKER[user_id] = {'group': group_key_after, 'guild_id': member.guild.id, 'since': None, 'carry': carry}
+
+    for channel_id in affected:
+        _update_voice_eligibility(channel_id, now)
+        _update_vc_notify(channel_id, now)
 
+# --- 8. TASKS (Background Jobs) ---
 
-@tasks.loop(seconds=300.0) 
+@tasks.loop(time=POINT_SAVE_TIMES) 
 async def point_saver():
     """Merges in-memory points to MongoDB, saves, and updates permanent message."""
     global POINT_CACHE, LEADERBOARD_CACHE
     
-    # 1. Merge cache to MongoDB
+    # 1. Pay out voice time earned so far, then merge cache to MongoDB (this also moves the changed users in each group's ranking)
+    now = time.time()
+    for user_id in list(VOICE_TRACKER):
+        credit_voice_time(user_id, now)
     if POINT_CACHE:
-        for guild_id, groups in POINT_CACHE.items():
-            for group_key, users in groups.items():
-                for user_id, points in users.items():
-                    try:
-                        await db.update_user_points(guild_id, group_key, user_id, points)
-                    except Exception as e:
-                        print(f"ERROR saving points to DB for {user_id}: {e}")
-        
-        POINT_CACHE = {} 
+        try:
+            seq = POINT_SEQ
+            await db.bulk_merge_points(POINT_CACHE, seq)
+            POINT_CACHE = {} 
+            # The merge must be on disk before we forget the pending points
+            db.journal.flush()
+            POINT_JOURNAL.compact({"seq": seq})
+        except Exception as e:
+            print(f"ERROR saving points to DB: {e}")
+    try: await db.prune_history()
+    except Exception as e: print(f"ERROR pruning points history: {e}")
 
     # 2. Pre-calculate and cache leaderboards
     new_leaderboard_cache = {}
@@ -642,14 +1301,12 @@ async def point_saver():
         new_leaderboard_cache[guild_id] = {}
         
         for group_key, group_data in LEADERBOARD_GROUPS.items():
-            leader_data = await db.get_all_group_points(guild_id, group_key)
+            ranking = await db.get_group_ranking(guild_id, group_key)
             
-            if leader_data:
-                sorted_users = sorted(leader_data.items(), key=lambda item: item[1], reverse=True)
-                
+            if ranking:
                 new_leaderboard_cache[guild_id][group_key] = {
                     'updated': current_unix_timestamp, 
-                    'top_users': sorted_users[:20]  # Show Top 20
+                    'top_users': ranking.top(20)  # Show Top 20
                 }
             
     LEADERBOARD_CACHE = new_leaderboard_cache
@@ -658,18 +1315,13 @@ async def point_saver():
     global PERMANENT_LEADERBOARDS
     for group_key, data in list(PERMANENT_LEADERBOARDS.items()): 
         try:
-            channel = bot.get_channel(data['channel_id'])
-            if channel and channel.guild:
-                message = await channel.fetch_message(data['message_id'])
-                new_embed = await _create_leaderboard_embed(channel.guild, group_key)
-                await message.edit(embed=new_embed)
-                print(f"Permanent Leaderboard for {group_key} updated in {channel.name}.")
-            else:
-                 print(f"Warning: Permanent Leaderboard Channel ID {data['channel_id']} not found or bot left guild.")
+            if await update_permanent_leaderboard(group_key):
+                print(f"Permanent Leaderboard for {group_key} updated.")
 
         except discord.NotFound:
             print(f"Warning: Permanent Leaderboard message or channel not found for {group_key}. Clearing setting.")
             del PERMANENT_LEADERBOARDS[group_key] 
+            PERMANENT_MESSAGE_STATE.pop(group_key, None)
         except Exception as e:
             print(f"Error updating permanent leaderboard for {group_key}: {e}")
 
@@ -712,7 +1364,11 @@ async def check_points(ctx, member: discord.Member = None):
     
     for group_key, points in final_scores.items():
         group_name = LEADERBOARD_GROUPS.get(group_key, {}).get('name', group_key)
-        embed.add_field(name=group_name, value=f"{points} Points", inline=False)
+        ranking = await db.get_group_ranking(guild_id, group_key)
+        pending = POINT_CACHE.get(guild_id, {}).get(group_key, {}).get(user_id, 0)
+        rank, total_users = ranking.rank_for(user_id, pending)
+        top_percent = max(1, round(rank / total_users * 100))
+        embed.add_field(name=group_name, value=f"{points} Points • Rank **#{rank}** of {total_users} (Top {top_percent}%)", inline=False)
         
     await ctx.send(embed=embed)
 
@@ -809,7 +1465,7 @@ async def set_permanent_leaderboard(ctx, channel_id: int, message_id: int, group
         return
 
     try:
-        await channel.fetch_message(message_id)
+        await submit(lambda: channel.fetch_message(message_id), PRIORITY_INTERACTIVE, route=("fetch", channel.id))
     except discord.NotFound:
         await ctx.send("❌ Message ID not found in that channel.")
         return
@@ -823,9 +1479,10 @@ async def set_permanent_leaderboard(ctx, channel_id: int, message_id: int, group
         'message_id': message_id,
         'group_key': group_key
     }
+    PERMANENT_MESSAGE_STATE.pop(group_key, None)
     await save_config_to_db()
     
-    await ctx.send(f"✅ Permanent leaderboard message for **{LEADERBOARD_GROUPS[group_key]['name']}** set! It will update every 5 minutes.")
+    await ctx.send(f"✅ Permanent leaderboard message for **{LEADERBOARD_GROUPS[group_key]['name']}** set! It will update every {POINT_SAVE_INTERVAL // 60} minutes.")
 
 @bot.command(name='clearleaderboard')
 @commands.has_permissions(administrator=True) 
@@ -850,6 +1507,7 @@ async def clear_permanent_leaderboard(ctx, group_key: str = None):
     old_group_name = LEADERBOARD_GROUPS.get(group_key, {}).get('name', 'Unknown Group')
     
     del PERMANENT_LEADERBOARDS[group_key]
+    PERMANENT_MESSAGE_STATE.pop(group_key, None)
     await save_config_to_db()
 
     await ctx.send(f"🛑 Stopped updating the permanent leaderboard for **{old_group_name}**.")
@@ -859,7 +1517,7 @@ async def clear_permanent_leaderboard(ctx, group_key: str = None):
 @commands.has_permissions(administrator=True) 
 async def clear_group_points(ctx, group_key: str = None):
     """^clearpoints <GroupKey>: ADMIN command: Clears all points for a specified leaderboard group."""
-    global LEADERBOARD_CACHE, POINT_CACHE
+    global LEADERBOARD_CACHE, POINT_CACHE, POINT_SEQ
     
     if not group_key:
         group_list = ', '.join(LEADERBOARD_GROUPS.keys())
@@ -883,6 +1541,9 @@ async def clear_group_points(ctx, group_key: str = None):
         del LEADERBOARD_CACHE[guild_id][group_key]
     if guild_id in POINT_CACHE and group_key in POINT_CACHE[guild_id]:
         del POINT_CACHE[guild_id][group_key]
+    if POINT_JOURNAL:
+        POINT_SEQ += 1
+        POINT_JOURNAL.append({"op": "clear", "g": guild_id, "k": group_key, "n": POINT_SEQ})
 
     # 3. Update the permanent message immediately to show 0 points
     if not point_saver.is_running():
@@ -892,8 +1553,8 @@ async def clear_group_points(ctx, group_key: str = None):
 
 
 @bot.command(name='leaderboard')
-async def show_leaderboard(ctx, group_key: str = None):
-    """^leaderboard <GroupKey>: Displays the points leaderboard for the specified group from the cache."""
+async def show_leaderboard(ctx, group_key: str = None, span: str = None):
+    """^leaderboard <GroupKey> [week|month]: Displays the points leaderboard for the specified group (all time, or this week/month)."""
     if not group_key:
         group_list = ', '.join(LEADERBOARD_GROUPS.keys())
         await ctx.send(f"❌ Please specify which leaderboard group you want to see. Available groups: **{group_list}**. Example: `{PREFIX}leaderboard Group1`")
@@ -904,8 +1565,14 @@ async def show_leaderboard(ctx, group_key: str = None):
         group_list = ', '.join(LEADERBOARD_GROUPS.keys())
         await ctx.send(f"❌ Leaderboard group **{group_key}** not found. Available groups: **{group_list}**.")
         return
+
+    if span:
+        span = span.lower()
+        if span not in ("week", "month"):
+            await ctx.send(f"❌ Unknown period **{span}**. Use `week` or `month`, e.g. `{PREFIX}leaderboard {group_key} week`.")
+            return
     
-    embed = await _create_leaderboard_embed(ctx.guild, group_key)
+    embed = await _create_leaderboard_embed(ctx.guild, group_key, span)
     await ctx.send(embed=embed)
 
 
@@ -953,12 +1620,13 @@ async def track_category(ctx, group_key: str = None, category_id: int = None):
         await ctx.send("❌ That ID is not a valid Discord Category.")
         return
 
-    is_tracked = is_category_tracked(category)
+    is_tracked = CATEGORY_GROUPS.get(category_id)
     if is_tracked:
         await ctx.send(f"⚠️ **{category.name}** is already being tracked by **{is_tracked}**. Remove it from that group first.")
         return
 
     LEADERBOARD_GROUPS[group_key]['categories'].append(category_id)
+    rebuild_category_index()
     await save_config_to_db() 
     await ctx.send(f"✅ Now tracking all channels in **{category.name}** for group **{LEADERBOARD_GROUPS[group_key]['name']}**!")
 
@@ -984,6 +1652,7 @@ async def untrack_category(ctx, group_key: str = None, category_id: int = None):
         return
 
     LEADERBOARD_GROUPS[group_key]['categories'].remove(category_id)
+    rebuild_category_index()
     await save_config_to_db() 
     await ctx.send(f"🛑 Stopped tracking category ID `{category_id}` for group **{LEADERBOARD_GROUPS[group_key]['name']}**.")
 
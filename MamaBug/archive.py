@@ -2,27 +2,33 @@ import sys
 sys.path.append('..')
 from secret_bot import TOKEN
 import discord
-from discord.ext import commands, tasks
+from discord.ext import commands
 import asyncio
 from datetime import datetime, timedelta, timezone, time
 import json
 import os
+from local_db import Journal, replay_ops
+from rest_scheduler import submit, PRIORITY_MODERATION
+from lockout_schedule import LockoutSchedule, is_locked_at
+from jail_timers import JailTimers
 
 # --- FUNCTION LIST ---
-# 1. DatabaseHandler Class: Handles all local JSON database interactions.
+# 1. DatabaseHandler Class: Handles all local JSON database interactions (lockouts indexed by user).
 # 2. load_config(): Loads the global bot configuration from the database.
-# 3. is_time_in_range(start, end, current): Helper for lockout time checking.
-# 4. on_ready(): Startup sequence, initializes DB and tasks.
-# 5. on_raw_reaction_add(): Handles manual role removal via reaction.
-# 6. on_voice_state_update(): Handles jail logic (tracking time spent in voice).
-# 7. check_lockout_times(): Background task for scheduled role lockouts.
-# 8. help(): Custom help command.
-# 9. myset(): Command for users to set their own lockout schedule.
-# 10. myview(): Command for users to view their lockout settings.
-# 11. myclear(): Command for users to delete their lockout settings.
-# 12. adminclear(): Admin command to force clear a user lockout.
-# 13. setjail(): Admin command to set the jail voice channel.
-# 14. timeout(): Admin command to initiate a user timeout/jail sentence.
+# 3. on_ready(): Startup sequence, initializes DB and tasks.
+# 4. on_raw_reaction_add(): Handles manual role removal via reaction.
+# 5. on_voice_state_update(): Feeds jail VC joins/leaves into the jail timers.
+# 5a. save_jail_timeouts() / release_from_jail() / sync_jail(): Jail timer callbacks and startup reconciliation.
+# 6a. find_lockout_zone() / schedule_lockout() / rebuild_lockout_schedule(): Plan each user's next lock/unlock in their time zone.
+# 6b. lockout_worker() / apply_lockouts(): Sleep until lockouts are due, then apply them as one batch with one save.
+# 6c. on_member_update(): Re-plans a user when their time zone role changes.
+# 7. help(): Custom help command.
+# 8. myset(): Command for users to set their own lockout schedule.
+# 9. myview(): Command for users to view their lockout settings.
+# 10. myclear(): Command for users to delete their lockout settings.
+# 11. adminclear(): Admin command to force clear a user lockout.
+# 12. setjail(): Admin command to set the jail voice channel.
+# 13. timeout(): Admin command to initiate a user timeout/jail sentence.
 
 # --- 1. CONFIGURATION ---
 PREFIX = "&"
@@ -48,25 +54,34 @@ JAIL_CONFIG = {
     "voice_channel_id": None,
     "active_timeouts": {} # {user_id: {"remaining_seconds": X, "last_check": timestamp}}
 }
+JAIL = None # JailTimers over JAIL_CONFIG["active_timeouts"], created in on_ready
 
 db = None
 
+# {user_id: next lock/unlock time}; rebuilt from user_lockouts on startup, changed by the lockout commands
+LOCKOUT_SCHEDULE = LockoutSchedule()
+LOCKOUT_TASK = None
+
 # --- 3. DATABASE CLASS ---
 class DatabaseHandler:
     def __init__(self, uri, db_name):
         self.file_path = "database.json"
+        self.journal = Journal(self.file_path)
         self.data = self._load_from_file()
+        self.lockouts_by_user = {doc.get("_id"): doc for doc in self.data.get("user_lockouts", [])} # {user_id: doc} over data["user_lockouts"]
 
     def _load_from_file(self):
-        try:
-            with open(self.file_path, "r") as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {"bot_config": [], "sticky_messages": [], "user_lockouts": [], "jail_data": {}}
+        data = self.journal.read_snapshot({"bot_config": [], "sticky_messages": [], "user_lockouts": [], "jail_data": {}})
+        replay_ops(data, self.journal.read_ops())
+        return data
 
     def _save_to_file(self):
-        with open(self.file_path, "w") as f:
-            json.dump(self.data, f, indent=4, default=str)
+        """Writes the whole database as a fresh snapshot (the journal handles everyday saves)."""
+        self.journal.compact(self.data)
+
+    def _log(self, *ops):
+        self.journal.append(*ops)
+        self.journal.maybe_compact(lambda: self.data)
 
     async def load_config(self):
         collection = self.data.get("bot_config", [])
@@ -82,31 +97,36 @@ class DatabaseHandler:
         collection = [d for d in collection if d.get("_id") != "config"]
         collection.append(data_to_save)
         self.data["bot_config"] = collection
-        self._save_to_file()
+        self._log({"op": "put", "c": "bot_config", "doc": data_to_save})
 
     async def get_user_lockout(self, user_id):
-        collection = self.data.get("user_lockouts", [])
-        for doc in collection:
-            if doc.get("_id") == user_id:
-                return doc
-        return None
+        return self.lockouts_by_user.get(user_id)
 
     async def save_user_lockout(self, user_id, data):
-        collection = self.data.get("user_lockouts", [])
-        existing = await self.get_user_lockout(user_id)
-        new_doc = existing.copy() if existing else {"_id": user_id}
-        new_doc.update(data)
-        new_doc["_id"] = user_id 
-        collection = [d for d in collection if d.get("_id") != user_id]
-        collection.append(new_doc)
-        self.data["user_lockouts"] = collection
-        self._save_to_file()
+        await self.save_user_lockouts({user_id: data})
 
     async def delete_user_lockout(self, user_id):
+        if self.lockouts_by_user.pop(user_id, None) is None: return
         collection = self.data.get("user_lockouts", [])
-        collection = [d for d in collection if d.get("_id") != user_id]
-        self.data["user_lockouts"] = collection
-        self._save_to_file()
+        self.data["user_lockouts"] = [d for d in collection if d.get("_id") != user_id]
+        self._log({"op": "del", "c": "user_lockouts", "match": {"_id": user_id}})
+
+    async def save_user_lockouts(self, updates):
+        """Applies {user_id: fields} to several lockouts and saves them in a single write."""
+        ops = []
+        for user_id, data in updates.items():
+            doc = self.lockouts_by_user.get(user_id)
+            if doc is None:
+                doc = self.lockouts_by_user[user_id] = {"_id": user_id}
+                self.data.setdefault("user_lockouts", []).append(doc)
+            doc.update(data)
+            doc["_id"] = user_id
+            ops.append({"op": "put", "c": "user_lockouts", "doc": doc})
+        if ops:
+            self._log(*ops)
+
+    def save_jail_data(self):
+        self._log({"op": "set", "c": "jail_data", "value": self.data.get("jail_data", {})})
 
     async def load_data(self):
         return await self.load_config()
@@ -123,26 +143,24 @@ async def load_config():
     jail_data = db.data.get("jail_data", {})
     JAIL_CONFIG["voice_channel_id"] = jail_data.get("voice_channel_id")
     JAIL_CONFIG["active_timeouts"] = jail_data.get("active_timeouts", {})
+    JAIL.load(JAIL_CONFIG["active_timeouts"])
     
     print("✅ Configuration loaded!")
 
-def is_time_in_range(start_str, end_str, current_dt):
-    current_time = current_dt.time()
-    start_time = datetime.strptime(start_str, "%H:%M").time()
-    end_time = datetime.strptime(end_str, "%H:%M").time()
-    if start_time < end_time:
-        return start_time <= current_time <= end_time
-    else: 
-        return current_time >= start_time or current_time <= end_time
-
 # --- 5. EVENTS ---
 
 @bot.event
 async def on_ready():
-    global db
-    db = DatabaseHandler("mongodb://localhost:27017", DB_NAME)
-    await load_config()
-    check_lockout_times.start()
+    global db, JAIL, LOCKOUT_TASK
+    if db is None:
+        # Only on the first connect; a reconnect keeps the loaded state and running timers
+        db = DatabaseHandler("mongodb://localhost:27017", DB_NAME)
+        JAIL = JailTimers(release_from_jail, save_jail_timeouts)
+        await load_config()
+    rebuild_lockout_schedule()
+    if LOCKOUT_TASK is None or LOCKOUT_TASK.done():
+        LOCKOUT_TASK = asyncio.create_task(lockout_worker())
+    await sync_jail()
     print(f"Logged in as {bot.user}")
 
 @bot.event
@@ -164,125 +182,133 @@ async def on_raw_reaction_add(payload):
 
 @bot.event
 async def on_voice_state_update(member, before, after):
-    """Handles time tracking for users in timeout."""
+    """Starts/stops a jailed user's clock when they join or leave the jail VC."""
     user_id = str(member.id)
-    if user_id not in JAIL_CONFIG["active_timeouts"]:
-        return
-
     jail_vc_id = JAIL_CONFIG["voice_channel_id"]
-    if not jail_vc_id:
+    if not jail_vc_id or user_id not in JAIL:
         return
 
-    now = datetime.now().timestamp()
-    timeout_data = JAIL_CONFIG["active_timeouts"][user_id]
+    was_in = before.channel is not None and before.channel.id == jail_vc_id
+    now_in = after.channel is not None and after.channel.id == jail_vc_id
+    if now_in and not was_in:
+        await JAIL.enter(user_id)
+    elif was_in and not now_in:
+        await JAIL.leave(user_id)
 
-    # Entering Jail VC
-    if after.channel and after.channel.id == jail_vc_id:
-        timeout_data["last_check"] = now
-    
-    # Leaving Jail VC
-    elif (not after.channel or after.channel.id != jail_vc_id) and before.channel and before.channel.id == jail_vc_id:
-        if timeout_data.get("last_check"):
-            diff = now - timeout_data["last_check"]
-            timeout_data["remaining_seconds"] = max(0, timeout_data["remaining_seconds"] - diff)
-            timeout_data["last_check"] = None
-            
-            # Save progress
-            db.data["jail_data"]["active_timeouts"] = JAIL_CONFIG["active_timeouts"]
-            db._save_to_file()
-
-            # Check if sentence is over
-            if timeout_data["remaining_seconds"] <= 0:
-                target_role_id = LOCKOUT_CONFIG.get('target_role_id')
-                if target_role_id:
-                    role = member.guild.get_role(target_role_id)
-                    if role:
-                        try:
-                            await member.add_roles(role)
-                            del JAIL_CONFIG["active_timeouts"][user_id]
-                            db.data["jail_data"]["active_timeouts"] = JAIL_CONFIG["active_timeouts"]
-                            db._save_to_file()
-                            
-                            log_channel = bot.get_channel(1434622477660717056)
-                            if log_channel:
-                                await log_channel.send(f"🔓 {member.mention} has completed their timeout and regained NSFW access!")
-                        except Exception as e:
-                            print(f"Failed to restore role to user in timeout: {e}")
-
-# --- 6. BACKGROUND TASK ---
-
-@tasks.loop(minutes=1)
-async def check_lockout_times():
-    # Jail Logic Update (Tick while they are in VC)
-    now = datetime.now().timestamp()
-    jail_vc_id = JAIL_CONFIG["voice_channel_id"]
-    
-    if jail_vc_id:
-        for uid, data in list(JAIL_CONFIG["active_timeouts"].items()):
-            member_id = int(uid)
-            # Find the member in guilds
-            for guild in bot.guilds:
-                member = guild.get_member(member_id)
-                if member and member.voice and member.voice.channel and member.voice.channel.id == jail_vc_id:
-                    if data.get("last_check"):
-                        diff = now - data["last_check"]
-                        data["remaining_seconds"] = max(0, data["remaining_seconds"] - diff)
-                        data["last_check"] = now
-                        
-                        if data["remaining_seconds"] <= 0:
-                            target_role_id = LOCKOUT_CONFIG.get('target_role_id')
-                            if target_role_id:
-                                role = guild.get_role(target_role_id)
-                                if role:
-                                    try:
-                                        await member.add_roles(role)
-                                        del JAIL_CONFIG["active_timeouts"][uid]
-                                        log_channel = bot.get_channel(1434622477660717056)
-                                        if log_channel:
-                                            await log_channel.send(f"🔓 {member.mention} has completed their timeout and regained NSFW access!")
-                                    except: pass
-                    else:
-                        data["last_check"] = now
-            
-        db.data["jail_data"]["active_timeouts"] = JAIL_CONFIG["active_timeouts"]
-        db._save_to_file()
-
-    # Original Lockout Logic
-    if not LOCKOUT_CONFIG: return 
-    current_utc = datetime.now(timezone.utc)
+async def save_jail_timeouts():
+    db.data["jail_data"]["active_timeouts"] = JAIL_CONFIG["active_timeouts"]
+    db.save_jail_data()
+
+async def release_from_jail(user_id):
+    """Called by the jail timers the moment a sentence is fully served."""
     target_role_id = LOCKOUT_CONFIG.get('target_role_id')
     if not target_role_id: return
+    for guild in bot.guilds:
+        member = guild.get_member(int(user_id))
+        role = guild.get_role(target_role_id)
+        if not member or not role: continue
+        try:
+            await submit(lambda: member.add_roles(role), PRIORITY_MODERATION, route=("roles", guild.id))
+            await JAIL.release(user_id)
+            log_channel = bot.get_channel(1434622477660717056)
+            if log_channel:
+                await log_channel.send(f"🔓 {member.mention} has completed their timeout and regained NSFW access!")
+        except Exception as e:
+            print(f"Failed to restore role to user in timeout: {e}")
+        return
 
+async def sync_jail():
+    """Starts/stops clocks for whoever is (not) in the jail VC right now, in case events were missed while offline."""
+    channel = bot.get_channel(JAIL_CONFIG["voice_channel_id"]) if JAIL_CONFIG["voice_channel_id"] else None
+    in_jail = {str(m.id) for m in channel.members} if channel else set()
+    await JAIL.sync(in_jail)
+
+# --- 6. LOCKOUT SCHEDULE ---
+
+def find_lockout_zone(user_id):
+    """Returns (member, target_role, offset) from the user's time zone role, or None if they have none."""
+    target_role_id = LOCKOUT_CONFIG.get('target_role_id')
+    if not target_role_id: return None
     for zone_config in TIME_ZONES:
         guild = bot.get_guild(zone_config['guild_id'])
         if not guild: continue
+        member = guild.get_member(user_id)
         target_role = guild.get_role(target_role_id)
-        tz_role = guild.get_role(zone_config['role_id'])
-        if not tz_role or not target_role: continue
-        offset = zone_config['offset']
-        local_time = current_utc + timedelta(hours=offset)
-
-        for member in tz_role.members:
-            user_data = await db.get_user_lockout(member.id)
-            if not user_data or 'start' not in user_data: continue
-            should_be_locked = is_time_in_range(user_data['start'], user_data['end'], local_time)
-            has_role = target_role in member.roles
-            was_locked_by_bot = user_data.get('locked_by_bot', False)
-
-            if should_be_locked and has_role:
-                try: 
-                    await member.remove_roles(target_role)
-                    await db.save_user_lockout(member.id, {"locked_by_bot": True})
-                except: pass
-            elif not should_be_locked and not has_role and was_locked_by_bot:
-                try: 
-                    await member.add_roles(target_role)
-                    await db.save_user_lockout(member.id, {"locked_by_bot": False})
-                except: pass
-
-@check_lockout_times.before_loop
-async def before_check():
+        if not member or not target_role: continue
+        if any(r.id == zone_config['role_id'] for r in member.roles):
+            return member, target_role, zone_config['offset']
+    return None
+
+def schedule_lockout(user_id, user_data):
+    zone = find_lockout_zone(user_id) if user_data and 'start' in user_data else None
+    if not zone:
+        return LOCKOUT_SCHEDULE.remove(user_id)
+    LOCKOUT_SCHEDULE.set(user_id, user_data['start'], user_data['end'], zone[2])
+
+def rebuild_lockout_schedule():
+    LOCKOUT_SCHEDULE.clear()
+    for user_data in db.data.get("user_lockouts", []):
+        schedule_lockout(user_data.get("_id"), user_data)
+    print(f"✅ Scheduled {len(LOCKOUT_SCHEDULE)} lockouts.")
+
+def _role_change(member, role, lock):
+    if lock:
+        return lambda: member.remove_roles(role)
+    return lambda: member.add_roles(role)
+
+async def apply_lockouts(due):
+    """Applies every lock/unlock that fell due together, then records them with one save."""
+    changes = [] # (member, role, lock)
+    for user_id, should_be_locked in due:
+        user_data = await db.get_user_lockout(user_id)
+        zone = find_lockout_zone(user_id)
+        if not user_data or 'start' not in user_data or not zone: continue
+        member, target_role, _ = zone
+        has_role = target_role in member.roles
+        if should_be_locked and has_role:
+            changes.append((member, target_role, True))
+        elif not should_be_locked and not has_role and user_data.get('locked_by_bot', False):
+            changes.append((member, target_role, False))
+    if not changes: return
+
+    results = await asyncio.gather(*[
+        submit(_role_change(member, role, lock), PRIORITY_MODERATION, route=("roles", member.guild.id))
+        for member, role, lock in changes
+    ], return_exceptions=True)
+    updates = {}
+    for (member, role, lock), result in zip(changes, results):
+        if isinstance(result, Exception):
+            print(f"Lockout role change failed for {member}: {result}")
+        else:
+            updates[member.id] = {"locked_by_bot": lock}
+    await db.save_user_lockouts(updates)
+
+async def lockout_worker():
+    """Sleeps until the next lock or unlock is due, so idle minutes touch no members at all."""
     await bot.wait_until_ready()
+    while True:
+        await LOCKOUT_SCHEDULE.wait()
+        due = LOCKOUT_SCHEDULE.pop_due()
+        if due:
+            await apply_lockouts(due)
+
+@bot.event
+async def on_member_update(before, after):
+    """Time zone role changes move a user's lockout times; a target role re-added mid-lockout is taken back."""
+    if before.roles == after.roles: return
+    user_data = await db.get_user_lockout(after.id) if db else None
+    if not user_data or 'start' not in user_data: return
+    zone_role_ids = {z['role_id'] for z in TIME_ZONES}
+    if {r.id for r in before.roles} & zone_role_ids != {r.id for r in after.roles} & zone_role_ids:
+        schedule_lockout(after.id, user_data)
+        return
+    target_role_id = LOCKOUT_CONFIG.get('target_role_id')
+    gained_target = any(r.id == target_role_id for r in after.roles) and not any(r.id == target_role_id for r in before.roles)
+    zone = find_lockout_zone(after.id)
+    if gained_target and zone:
+        local_time = datetime.now(timezone.utc) + timedelta(hours=zone[2])
+        if is_locked_at(user_data['start'], user_data['end'], local_time):
+            await apply_lockouts([(after.id, True)])
 
 # --- 7. COMMANDS ---
 
@@ -314,6 +340,7 @@ async def myset(ctx, start: str, end: str, repeat: str):
         return
     data = {"start": start, "end": end, "repeat": repeat.lower(), "locked_by_bot": False}
     await db.save_user_lockout(ctx.author.id, data)
+    schedule_lockout(ctx.author.id, await db.get_user_lockout(ctx.author.id))
     await ctx.send(f"✅ Lockout set for **{start}** to **{end}**!")
 
 @bot.command()
@@ -328,15 +355,20 @@ async def myview(ctx):
 async def myclear(ctx):
     user_data = await db.get_user_lockout(ctx.author.id)
     if not user_data: return await ctx.send("You don't have a custom lockout set.")
-    if 'start' in user_data and is_time_in_range(user_data['start'], user_data['end'], datetime.now()):
+    # Judged in the user's own time zone, like the schedule (no zone role = never enforced)
+    zone = find_lockout_zone(ctx.author.id)
+    local_time = datetime.now(timezone.utc) + timedelta(hours=zone[2]) if zone else None
+    if 'start' in user_data and local_time and is_locked_at(user_data['start'], user_data['end'], local_time):
          return await ctx.send("❌ You cannot clear your lockout while it is active!")
     await db.delete_user_lockout(ctx.author.id)
+    LOCKOUT_SCHEDULE.remove(ctx.author.id)
     await ctx.send("🗑️ Your custom lockout has been cleared.")
 
 @bot.command()
 @commands.has_permissions(administrator=True)
 async def adminclear(ctx, member: discord.Member):
     await db.delete_user_lockout(member.id)
+    LOCKOUT_SCHEDULE.remove(member.id)
     await ctx.send(f"🧹 Admin Force: Cleared lockout for **{member.display_name}**.")
 
 @bot.command()
@@ -349,7 +381,8 @@ async def setjail(ctx, channel_id: int):
     
     JAIL_CONFIG["voice_channel_id"] = channel_id
     db.data["jail_data"] = {"voice_channel_id": channel_id, "active_timeouts": JAIL_CONFIG["active_timeouts"]}
-    db._save_to_file()
+    db.save_jail_data()
+    await sync_jail()
     await ctx.send(f"✅ Jail voice channel set to **{channel.name}**.")
 
 @bot.command()
@@ -369,21 +402,11 @@ async def timeout(ctx, member: discord.Member, minutes: int):
 
     try:
         # Remove role
-        await member.remove_roles(role)
-        
-        # Add to timeout tracker
-        user_id = str(member.id)
-        JAIL_CONFIG["active_timeouts"][user_id] = {
-            "remaining_seconds": minutes * 60,
-            "last_check": None
-        }
+        await submit(lambda: member.remove_roles(role), PRIORITY_MODERATION, route=("roles", ctx.guild.id))
         
-        # If already in the jail VC, start timer immediately
-        if member.voice and member.voice.channel and member.voice.channel.id == JAIL_CONFIG["voice_channel_id"]:
-            JAIL_CONFIG["active_timeouts"][user_id]["last_check"] = datetime.now().timestamp()
-
-        db.data["jail_data"]["active_timeouts"] = JAIL_CONFIG["active_timeouts"]
-        db._save_to_file()
+        # Start the sentence; the clock only runs while they're in the jail VC
+        in_jail = bool(member.voice and member.voice.channel and member.voice.channel.id == JAIL_CONFIG["voice_channel_id"])
+        await JAIL.jail(str(member.id), minutes * 60, in_jail=in_jail)
 
         jail_channel = bot.get_channel(JAIL_CONFIG["voice_channel_id"])
         await ctx.send(f"𐂺 {member.mention} has been put in timeout for **{minutes} minutes**. They must stay in {jail_channel.mention} to regain NSFW access.")
@@ -15,85 +15,8 @@ bot = commands.Bot(command_prefix="$", intents=intents)
 
 # --- DATABASE CONNECTION ---
 # --- DATABASE CONNECTION (LOCAL FILE VERSION) ---
-import json
-import os
-
-DB_FILE = "database.json"
-
-class AsyncIterator:
-    def __init__(self, items):
-        self.items = items
-    def __aiter__(self):
-        self.idx = 0
-        return self
-    async def __anext__(self):
-        if self.idx >= len(self.items): raise StopAsyncIteration
-        item = self.items[self.idx]
-        self.idx += 1
-        return item
-
-class LocalCollection:
-    def __init__(self, name):
-        self.name = name
-
-    def _load_all(self):
-        try:
-            with open(DB_FILE, "r") as f:
-                return json.load(f)
-        except: return {}
-
-    def _save_all(self, data):
-        with open(DB_FILE, "w") as f:
-            json.dump(data, f, indent=4, default=str)
-
-    async def find_one(self, query):
-        all_data = self._load_all()
-        collection = all_data.get(self.name, [])
-        for doc in collection:
-            if all(doc.get(k) == v for k, v in query.items()):
-                return doc
-        return None
-
-    def find(self, query={}):
-        all_data = self._load_all()
-        collection = all_data.get(self.name, [])
-        results = [doc for doc in collection if all(doc.get(k) == v for k, v in query.items())]
-        return AsyncIterator(results)
-
-    async def insert_one(self, doc):
-        all_data = self._load_all()
-        if self.name not in all_data: all_data[self.name] = []
-        all_data[self.name].append(doc)
-        self._save_all(all_data)
-
-    async def delete_one(self, query):
-        all_data = self._load_all()
-        collection = all_data.get(self.name, [])
-        new_collection = [doc for doc in collection if not all(doc.get(k) == v for k, v in query.items())]
-        all_data[self.name] = new_collection
-        self._save_all(all_data)
-        
-    async def replace_one(self, query, doc, upsert=False):
-        await self.delete_one(query)
-        await self.insert_one(doc)
-
-    async def update_one(self, query, update):
-        all_data = self._load_all()
-        collection = all_data.get(self.name, [])
-        found = False
-        for doc in collection:
-            # Check if this doc matches the query
-            if all(doc.get(k) == v for k, v in query.items()):
-                # Handle $set update
-                if "$set" in update:
-                    doc.update(update["$set"])
-                found = True
-                break
-        
-        if found:
-            self._save_all(all_data)
-        return found
-
+from local_db import LocalCollection
+from rest_scheduler import submit, PRIORITY_INTERACTIVE
 
 # --- REPLACED CONNECTION ---
 # cluster = motor.motor_asyncio.AsyncIOMotorClient(MONGO_URL)
@@ -121,6 +44,19 @@ config = {
     ]
 }
 
+webhook_cache = {} # {channel_id: Webhook}, so the webhook is only looked up once per channel
+
+async def get_copy_webhook(channel):
+    """Returns the PuppyPetHook webhook for a channel, finding or creating it the first time only."""
+    webhook = webhook_cache.get(channel.id)
+    if webhook is None:
+        webhooks = await submit(channel.webhooks, PRIORITY_INTERACTIVE, route=("webhooks", channel.id))
+        webhook = discord.utils.get(webhooks, name="PuppyPetHook")
+        if not webhook:
+            webhook = await submit(lambda: channel.create_webhook(name="PuppyPetHook"), PRIORITY_INTERACTIVE, route=("webhooks", channel.id))
+        webhook_cache[channel.id] = webhook
+    return webhook
+
 @bot.event
 async def on_ready():
     global config
@@ -157,11 +93,7 @@ async def on_message(message):
 
             if target_channel:
                 # 4. Webhook Impersonation
-                webhooks = await target_channel.webhooks()
-                webhook = discord.utils.get(webhooks, name="PuppyPetHook")
-                
-                if not webhook:
-                    webhook = await target_channel.create_webhook(name="PuppyPetHook")
+                webhook = await get_copy_webhook(target_channel)
 
                 # Prepare content: Original text + Attachment Links
                 content_to_send = message.content
@@ -174,13 +106,17 @@ async def on_message(message):
                     content_to_send += "\n".join([att.url for att in message.attachments])
 
                 try:
-                    await webhook.send(
+                    await submit(lambda: webhook.send(
                         content=content_to_send,
                         username=message.author.display_name,
                         avatar_url=message.author.display_avatar.url,
                         embeds=message.embeds, # This copies embeds too!
                         wait=True
-                    )
+                    ), PRIORITY_INTERACTIVE, route=("webhook", webhook.id))
+                except discord.NotFound:
+                    # Someone deleted the webhook: look it up (or make a new one) next time
+                    webhook_cache.pop(target_channel.id, None)
+                    print("Webhook was deleted; it will be recreated for the next message.")
                 except Exception as e:
                     print(f"Error sending webhook: {e}")
 
@@ -0,0 +1,23 @@
+# --- FUNCTIONS IN THIS FILE ---
+# 1. find_deleter(entries, message, deleted_at) - Who deleted a message, from a batch of message_delete audit log entries.
+# ------------------------------
+
+AUDIT_MATCH_SECONDS = 20 # How far apart the audit log entry and the deletion we saw may be (either way, clocks drift)
+
+
+def find_deleter(entries, message, deleted_at, window=AUDIT_MATCH_SECONDS):
+    """
+    Returns entry.user for the first entry whose target is the message's author, whose channel
+    (entry.extra.channel) is the message's channel, and whose time is within window seconds of
+    deleted_at. None if nothing fits (usually the author deleted it themselves).
+    """
+    for entry in entries:
+        target = getattr(entry, "target", None)
+        channel = getattr(getattr(entry, "extra", None), "channel", None)
+        if target is None or channel is None:
+            continue
+        if target.id != message.author.id or channel.id != message.channel.id:
+            continue
+        if abs((deleted_at - entry.created_at).total_seconds()) < window:
+            return entry.user
+    return None
@@ -0,0 +1,124 @@
+import asyncio
+import time
+
+# --- FUNCTIONS IN THIS FILE ---
+# 1. JailTimers - Jail sentences driven by voice events. Time served is measured on the monotonic clock
+#    between enter() and leave(), and one call_later per serving user fires the moment their time runs out.
+#    Nothing polls; the saved timeouts dict is only written when someone's state changes. Serving users are
+#    saved with a wall-clock deadline, so time they keep serving while the bot is down still counts.
+# ------------------------------
+
+
+class JailTimers:
+    def __init__(self, on_release, on_change):
+        self.timeouts = {}     # Saved form: {user_id: {"remaining_seconds": X, "last_check": wall-clock time they entered or None,
+                               #                        "deadline": wall-clock time they are done if they stay (only while serving)}}
+        self._since = {}       # {user_id: time.monotonic() when they entered the jail VC}
+        self._timers = {}      # {user_id: asyncio.TimerHandle for the moment their time runs out}
+        self._resume = {}      # {user_id: saved deadline} for users who were serving when the timeouts were saved
+        self.on_release = on_release  # async fn(user_id): time is up, give the role back and call release()
+        self.on_change = on_change    # async fn(): persist self.timeouts
+
+    def load(self, timeouts):
+        """
+        Takes over a saved timeouts dict. Nobody counts as serving until sync()/enter() sees them in the VC.
+        Users saved while serving who are still in the VC then have their deadline turned back into time
+        left, so everything since they entered counts (bot downtime included); a reload keeps time served too.
+        """
+        now = time.time()
+        carried = {user_id: now + self.remaining(user_id) for user_id in self._since}
+        for handle in self._timers.values():
+            handle.cancel()
+        self._timers = {}
+        self._since = {}
+        self._resume = {}
+        self.timeouts = timeouts
+        for user_id, data in timeouts.items():
+            deadline = carried.get(user_id, data.pop("deadline", None))
+            if deadline is not None:
+                self._resume[user_id] = deadline
+            data["last_check"] = None
+
+    def __contains__(self, user_id):
+        return user_id in self.timeouts
+
+    def is_serving(self, user_id):
+        return user_id in self._since
+
+    def remaining(self, user_id):
+        """Seconds left right now, counting the current stay in the VC."""
+        data = self.timeouts.get(user_id)
+        if data is None:
+            return 0
+        served = time.monotonic() - self._since[user_id] if user_id in self._since else 0
+        return max(0, data["remaining_seconds"] - served)
+
+    async def jail(self, user_id, seconds, in_jail=False):
+        self._stop(user_id)
+        self._resume.pop(user_id, None)
+        self.timeouts[user_id] = {"remaining_seconds": seconds, "last_check": None}
+        if in_jail:
+            self._start(user_id)
+        await self.on_change()
+
+    async def enter(self, user_id):
+        """User joined the jail VC. Returns True if that started their clock."""
+        if user_id not in self.timeouts or user_id in self._since:
+            return False
+        deadline = self._resume.pop(user_id, None)
+        if deadline is not None:
+            self.timeouts[user_id]["remaining_seconds"] = max(0, deadline - time.time())
+        self._start(user_id)
+        await self.on_change()
+        return True
+
+    async def leave(self, user_id, _expired=False):
+        """User left the jail VC. Banks the time they served and stops their clock."""
+        if user_id not in self._since:
+            return False
+        self.timeouts[user_id]["remaining_seconds"] = 0 if _expired else self.remaining(user_id)
+        self._stop(user_id)
+        await self.on_change()
+        if self.timeouts[user_id]["remaining_seconds"] <= 0:
+            await self.on_release(user_id)
+        return True
+
+    async def sync(self, in_jail):
+        """Matches the clocks to who is really in the jail VC (after startup/reconnect, when events were missed)."""
+        for user_id in list(self.timeouts):
+            if user_id in in_jail:
+                await self.enter(user_id)
+            else:
+                # Left while we weren't watching: like a missed leave event, only their saved time is kept
+                if self._resume.pop(user_id, None) is not None:
+                    await self.on_change()
+                await self.leave(user_id)
+
+    async def release(self, user_id):
+        """Ends a sentence (served or cleared)."""
+        self._stop(user_id)
+        self._resume.pop(user_id, None)
+        if self.timeouts.pop(user_id, None) is not None:
+            await self.on_change()
+
+    def _start(self, user_id):
+        data = self.timeouts[user_id]
+        self._since[user_id] = time.monotonic()
+        data["last_check"] = time.time()
+        data["deadline"] = data["last_check"] + data["remaining_seconds"]
+        loop = asyncio.get_running_loop()
+        self._timers[user_id] = loop.call_later(max(0, data["remaining_seconds"]), self._expire, user_id)
+
+    def _stop(self, user_id):
+        handle = self._timers.pop(user_id, None)
+        if handle:
+            handle.cancel()
+        self._since.pop(user_id, None)
+        if user_id in self.timeouts:
+            self.timeouts[user_id]["last_check"] = None
+            self.timeouts[user_id].pop("deadline", None)
+
+    def _expire(self, user_id):
+        self._timers.pop(user_id, None)
+        if user_id in self._since:
+            asyncio.get_running_loop().create_task(self.leave(user_id, _expired=True))
@@ -0,0 +1,496 @@
+import asyncio
+import atexit
+import copy
+import json
+import os
+import pickle
+import signal
+import sys
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# --- FUNCTIONS IN THIS FILE ---
+# 1. get_database(file_path) - Returns the shared in-memory database for a file (loads it once).
+# 2. flush_all() - Writes every journal's pending entries to disk right now (used on shutdown).
+# 3. replay_ops(data, ops) / apply_op(data, op) - Replays journal entries onto plain {collection: [docs]} data.
+# 4. Journal - Append-only log of changes next to database.json, compacted into a fresh snapshot.
+# 5. LocalDatabase - Holds every collection of one database.json in memory with hash indexes.
+# 6. LocalCollection - Async Mongo-like API (find_one, find, insert_one, update_one, ...) on top of it.
+# 7. AsyncIterator / DeleteResult - Small helpers that mimic what motor returns.
+# ------------------------------
+
+DB_FILE = "database.json"
+JOURNAL_SUFFIX = ".journal"
+COMPACT_EVERY = 500 # Journal entries before we fold them into a new snapshot
+FLUSH_DELAY = 0.5   # Seconds to gather changes before one journal write (keep it between 0.25 and 2)
+
+# Journal entries (one compact JSON object per line):
+#   {"op": "put", "c": collection, "doc": {...}, "key": ["_id"]}  -> replace the doc with the same key, or add it
+#   {"op": "del", "c": collection, "match": {...}}                -> remove every doc matching
+#   {"op": "set", "c": name, "value": ...}                        -> replace a whole top-level entry
+# Every entry carries the full new value, so replaying one twice is harmless.
+
+_DATABASES = {} # {absolute file path: LocalDatabase}
+_JOURNALS = []  # Every Journal created, so shutdown can flush them all
+
+
+def get_database(file_path=DB_FILE):
+    """Returns the database for file_path, loading it from disk the first time only."""
+    key = os.path.abspath(file_path)
+    if key not in _DATABASES:
+        _DATABASES[key] = LocalDatabase(key)
+    return _DATABASES[key]
+
+
+def flush_all():
+    """Writes every journal's pending entries to disk right now (used on shutdown)."""
+    for journal in _JOURNALS:
+        try: journal.flush()
+        except Exception as e: print(f"Journal flush failed for {journal.file_path}: {e}")
+
+
+def _on_terminate(signum, frame):
+    # manager.py restarts bots with pkill (SIGTERM), which would skip atexit otherwise. The signal can
+    # land while this thread is inside a journal write, so nothing is flushed from here: the loop does
+    # it between callbacks, or without a loop SystemExit unwinds the write and atexit flushes.
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        sys.exit(0)
+    loop.call_soon_threadsafe(_exit_after_flush)
+
+
+def _exit_after_flush():
+    flush_all()
+    sys.exit(0)
+
+
+def _install_shutdown_hooks():
+    atexit.register(flush_all)
+    try: signal.signal(signal.SIGTERM, _on_terminate)
+    except ValueError: pass # Not in the main thread
+
+
+def _hashable(value):
+    """Turns a field value into something we can use as an index key."""
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        return json.dumps(value, sort_keys=True, default=str)
+
+
+def _matches(doc, query):
+    return all(doc.get(k) == v for k, v in query.items())
+
+
+def apply_op(data, op):
+    """Replays one journal entry onto plain {collection: [docs]} data."""
+    replay_ops(data, [op])
+
+
+def _key_of(doc, fields):
+    return tuple(_hashable(doc.get(f)) for f in fields)
+
+
+def replay_ops(data, ops):
+    """
+    Replays journal entries onto plain {collection: [docs]} data. Puts and deletes find their docs
+    through a key index built once per collection (instead of a scan per entry), and deleted docs
+    are only dropped from the lists at the end.
+    """
+    indexes = {}    # {collection: {key fields: {key values: [positions]}}}
+    touched = set() # Collections that may hold deleted (None) slots
+
+    def index_for(name, fields):
+        by_fields = indexes.setdefault(name, {})
+        if fields not in by_fields:
+            index = by_fields[fields] = {}
+            for i, doc in enumerate(data[name]):
+                if doc is not None:
+                    index.setdefault(_key_of(doc, fields), []).append(i)
+        return by_fields[fields]
+
+    def add(name, i, doc):
+        for fields, index in indexes.get(name, {}).items():
+            index.setdefault(_key_of(doc, fields), []).append(i)
+
+    def drop(name, i, doc):
+        for fields, index in indexes.get(name, {}).items():
+            key = _key_of(doc, fields)
+            positions = index.get(key)
+            if positions and i in positions:
+                positions.remove(i)
+                if not positions: del index[key]
+
+    for op in ops:
+        name = op["c"]
+        if op["op"] == "set":
+            data[name] = op["value"]
+            indexes.pop(name, None)
+            touched.discard(name)
+            continue
+        collection = data.setdefault(name, [])
+        touched.add(name)
+        if op["op"] == "put":
+            doc = op["doc"]
+            fields = tuple(op.get("key", ["_id"]))
+            positions = index_for(name, fields).get(_key_of(doc, fields))
+            if positions:
+                i = positions[0] # The first match, like a scan would find
+                drop(name, i, collection[i])
+                collection[i] = doc
+            else:
+                collection.append(doc)
+                i = len(collection) - 1
+            add(name, i, doc)
+        elif op["op"] == "del":
+            fields = tuple(op["match"])
+            for i in list(index_for(name, fields).get(_key_of(op["match"], fields), ())):
+                drop(name, i, collection[i])
+                collection[i] = None
+
+    for name in touched:
+        data[name] = [doc for doc in data[name] if doc is not None]
+
+
+def _set_path(doc, path, value):
+    """Handles $set keys like "sfw.id" by walking/creating nested dicts."""
+    parts = path.split(".")
+    target = doc
+    for part in parts[:-1]:
+        if not isinstance(target.get(part), dict):
+            target[part] = {}
+        target = target[part]
+    target[parts[-1]] = value
+
+
+class Journal:
+    def __init__(self, file_path, compact_every=COMPACT_EVERY, flush_delay=FLUSH_DELAY, fsync=False):
+        self.file_path = file_path
+        self.journal_path = file_path + JOURNAL_SUFFIX
+        self.compact_every = compact_every
+        self.flush_delay = flush_delay
+        self.fsync = fsync # fsync every flush (one per flush_delay at most, not one per entry)
+        self.entries = 0 # Entries logged since the last snapshot
+        self._lock = threading.Lock()
+        # One worker so journal and snapshot writes always happen in the order they were asked for
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._last_job = None
+        self._compacting = False
+        # Entries waiting for the next flush, and the timer that will do it
+        self._pending = []
+        self._flush_handle = None
+        # Byte positions count everything ever appended, so they stay valid after the file is trimmed
+        self._written = os.path.getsize(self.journal_path) if os.path.exists(self.journal_path) else 0
+        self._trimmed = 0
+
+        if not _JOURNALS: _install_shutdown_hooks()
+        _JOURNALS.append(self)
+
+    def read_snapshot(self, default=None):
+        try:
+            with open(self.file_path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return default if default is not None else {}
+
+    def read_ops(self):
+        """Yields every entry written since the last snapshot (skips a half-written last line)."""
+        self.entries = 0
+        try:
+            with open(self.journal_path, "r") as f:
+                for line in f:
+                    try: op = json.loads(line)
+                    except json.JSONDecodeError: continue
+                    self.entries += 1
+                    yield op
+        except FileNotFoundError:
+            return
+
+    def append(self, *ops):
+        """Queues entries for the next flush. Everything logged within flush_delay becomes one write."""
+        lines = [json.dumps(op, separators=(",", ":"), default=str) + "\n" for op in ops]
+        self.entries += len(ops)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is None:
+            # No bot running (startup/scripts): just write it now
+            self._write_lines(lines)
+            return
+        self._pending.extend(lines)
+        if self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.flush_delay, self._flush_later)
+
+    def _flush_later(self):
+        self._flush_handle = None
+        if not self._pending: return
+        lines, self._pending = self._pending, []
+        self._last_job = self._executor.submit(self._write_lines, lines)
+
+    def flush(self):
+        """Writes pending entries right now, after any write already handed to the worker."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._last_job is not None:
+            try: self._last_job.result()
+            except Exception: pass
+        lines, self._pending = self._pending, []
+        if lines: self._write_lines(lines)
+
+    def _write_lines(self, lines):
+        data = "".join(lines).encode()
+        try:
+            with self._lock:
+                with open(self.journal_path, "ab") as f:
+                    f.write(data)
+                    if self.fsync:
+                        f.flush()
+                        os.fsync(f.fileno())
+                self._written += len(data)
+        except Exception as e:
+            print(f"Journal write failed for {self.journal_path}: {e}")
+
+    def maybe_compact(self, get_data):
+        """Compacts once enough entries piled up. get_data is only called if we actually do it."""
+        if self.entries >= self.compact_every and not self._compacting:
+            self.compact(get_data())
+
+    def compact(self, data):
+        """Writes data as the new snapshot and drops the journal entries it already covers."""
+        # Freeze the data as it is right now; pickle is a fast C copy, the JSON text is built by the worker
+        frozen = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+        # Anything still waiting to be flushed is already part of this snapshot, unless writing it fails
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        covered, self._pending = self._pending, []
+        entries, self.entries = self.entries, 0
+        self._compacting = True
+
+        # The slow part (serializing and writing the file) happens in the background when the bot is running
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        self._last_job = self._executor.submit(self._write_snapshot, frozen, covered, entries)
+        if loop is None:
+            self._last_job.result()
+
+    def _write_snapshot(self, frozen, covered=(), entries=0):
+        try:
+            # Runs after every earlier journal write, so all of them are covered by this snapshot
+            mark = self._written
+            text = json.dumps(pickle.loads(frozen), separators=(",", ":"), default=str)
+            tmp_path = self.file_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                f.write(text)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.file_path)
+        except Exception as e:
+            print(f"Journal compaction failed for {self.file_path}: {e}")
+            # The old snapshot is still the real one: the entries we held back have to reach the journal after all
+            if covered: self._write_lines(covered)
+            self.entries += entries
+            self._compacting = False
+            return
+
+        try:
+            # Keep only what was appended after the snapshot was taken
+            with self._lock:
+                if not os.path.exists(self.journal_path): return
+                with open(self.journal_path, "rb") as f:
+                    f.seek(mark - self._trimmed)
+                    tail = f.read()
+                with open(self.journal_path + ".tmp", "wb") as f:
+                    f.write(tail)
+                os.replace(self.journal_path + ".tmp", self.journal_path)
+                self._trimmed = mark
+        except Exception as e:
+            # Harmless: replaying entries the snapshot already covers gives the same data
+            print(f"Journal trim failed for {self.journal_path}: {e}")
+        finally:
+            self._compacting = False
+
+
+class AsyncIterator:
+    def __init__(self, items):
+        self.items = items
+    def __aiter__(self):
+        self.idx = 0
+        return self
+    async def __anext__(self):
+        if self.idx >= len(self.items): raise StopAsyncIteration
+        item = self.items[self.idx]
+        self.idx += 1
+        return item
+
+    async def to_list(self, length=None):
+        return self.items if length is None else self.items[:length]
+
+
+class DeleteResult:
+    def __init__(self, deleted_count):
+        self.deleted_count = deleted_count
+
+
+class LocalDatabase:
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.docs = {}    # {collection: {_id: doc}} (dicts keep insertion order for saving)
+        self.indexes = {} # {collection: {field: {value: set(_ids)}}}
+        self.journal = Journal(file_path)
+        self._load_from_file()
+
+    def _load_from_file(self):
+        added_ids = False
+        for name, collection in self.journal.read_snapshot().items():
+            if not isinstance(collection, list): continue
+            docs = self.docs.setdefault(name, {})
+            for doc in collection:
+                # Mongo gives every document an _id, so we do too (old files may not have one)
+                if "_id" not in doc:
+                    doc["_id"] = uuid.uuid4().hex
+                    added_ids = True
+                docs[doc["_id"]] = doc
+
+        for op in self.journal.read_ops():
+            if op["op"] == "put": self._put(op["c"], op["doc"])
+            elif op["op"] == "del": self._remove(op["c"], op["match"]["_id"])
+
+        # New _ids must be on disk before any journal entry refers to them
+        if added_ids: self._save_to_file()
+
+    def _snapshot(self):
+        return {name: list(docs.values()) for name, docs in self.docs.items()}
+
+    def _save_to_file(self):
+        self.journal.compact(self._snapshot())
+
+    def _log(self, op):
+        self.journal.append(op)
+        self.journal.maybe_compact(self._snapshot)
+
+    # --- INDEX HELPERS ---
+    def ensure_index(self, name, field):
+        """Builds a hash index on one field of a collection (no-op if it already exists)."""
+        indexes = self.indexes.setdefault(name, {})
+        if field in indexes: return
+        index = indexes[field] = {}
+        for doc_id, doc in self.docs.get(name, {}).items():
+            if field in doc:
+                index.setdefault(_hashable(doc[field]), set()).add(doc_id)
+
+    def _index_doc(self, name, doc):
+        for field, index in self.indexes.get(name, {}).items():
+            if field in doc:
+                index.setdefault(_hashable(doc[field]), set()).add(doc["_id"])
+
+    def _unindex_doc(self, name, doc):
+        for field, index in self.indexes.get(name, {}).items():
+            if field not in doc: continue
+            key = _hashable(doc[field])
+            bucket = index.get(key)
+            if bucket:
+                bucket.discard(doc["_id"])
+                if not bucket: del index[key]
+
+    def _candidates(self, name, query):
+        """Narrows a query down using the _id or a declared index before checking every field."""
+        docs = self.docs.get(name, {})
+        if "_id" in query:
+            doc = docs.get(query["_id"])
+            return [doc] if doc is not None else []
+        indexes = self.indexes.get(name, {})
+        for field, value in query.items():
+            if field in indexes:
+                return [docs[i] for i in indexes[field].get(_hashable(value), ())]
+        return list(docs.values())
+
+    def _put(self, name, doc):
+        docs = self.docs.setdefault(name, {})
+        old = docs.get(doc["_id"])
+        if old is not None: self._unindex_doc(name, old)
+        docs[doc["_id"]] = doc
+        self._index_doc(name, doc)
+
+    def _remove(self, name, doc_id):
+        doc = self.docs.get(name, {}).pop(doc_id, None)
+        if doc is not None: self._unindex_doc(name, doc)
+        return doc
+
+    # --- RAW OPERATIONS (everything below works on the live documents and journals the change) ---
+    def find(self, name, query):
+        return [doc for doc in self._candidates(name, query) if _matches(doc, query)]
+
+    def insert(self, name, doc):
+        if "_id" not in doc: doc["_id"] = uuid.uuid4().hex
+        self._put(name, doc)
+        self._log({"op": "put", "c": name, "doc": doc})
+
+    def delete(self, name, doc_id):
+        doc = self._remove(name, doc_id)
+        if doc is not None: self._log({"op": "del", "c": name, "match": {"_id": doc_id}})
+        return doc
+
+    def modify(self, name, doc, changes):
+        """Applies {path: value} changes to a stored doc and keeps the indexes in sync."""
+        self._unindex_doc(name, doc)
+        for path, value in changes.items():
+            _set_path(doc, path, value)
+        self._index_doc(name, doc)
+        self._log({"op": "put", "c": name, "doc": doc})
+
+
+class LocalCollection:
+    def __init__(self, name, indexes=(), db_file=DB_FILE):
+        self.name = name
+        self.db = get_database(db_file)
+        for field in indexes:
+            self.db.ensure_index(name, field)
+
+    async def find_one(self, query):
+        for doc in self.db.find(self.name, query):
+            return copy.deepcopy(doc)
+        return None
+
+    def find(self, query={}):
+        return AsyncIterator([copy.deepcopy(doc) for doc in self.db.find(self.name, query)])
+
+    async def find_all(self):
+        return [copy.deepcopy(doc) for doc in self.db.docs.get(self.name, {}).values()]
+
+    async def insert_one(self, doc):
+        self.db.insert(self.name, copy.deepcopy(doc))
+
+    async def delete_one(self, query):
+        # Like the old per-bot helpers, this removes every matching doc (callers rely on it)
+        found = self.db.find(self.name, query)
+        for doc in found:
+            self.db.delete(self.name, doc["_id"])
+        return DeleteResult(len(found))
+
+    async def replace_one(self, query, doc, upsert=False):
+        # Delete whatever matches, then always insert (the old helpers ignored upsert)
+        await self.delete_one(query)
+        await self.insert_one(doc)
+
+    async def update_one(self, query, update, upsert=False):
+        changes = copy.deepcopy(update.get("$set", {}))
+        for doc in self.db.find(self.name, query):
+            self.db.modify(self.name, doc, changes)
+            return True
+
+        # If not found and upsert is True, create it!
+        if upsert:
+            new_doc = copy.deepcopy(query)
+            for path, value in changes.items():
+                _set_path(new_doc, path, value)
+            self.db.insert(self.name, new_doc)
+            return True
+        return False
@@ -0,0 +1,133 @@
+import asyncio
+import heapq
+import time
+from datetime import datetime, timedelta, timezone
+
+# --- FUNCTIONS IN THIS FILE ---
+# 1. parse_hhmm(text) - "HH:MM" -> minutes since midnight (None if it isn't a valid time).
+# 2. is_locked_at(start, end, local_dt) - Whether a start-end lockout window covers local_dt (windows may cross midnight).
+# 3. next_transition(start, end, now, offset_hours) - Next timestamp at which the window opens or closes for that UTC offset.
+# 4. LockoutSchedule - Heap of (next transition, user_id), so lockout loops only wake up when someone is due.
+# ------------------------------
+
+WAKE_SLACK = 0.5  # Seconds to oversleep so a transition is never checked a moment too early
+
+
+def parse_hhmm(text):
+    try:
+        parsed = datetime.strptime(text, "%H:%M")
+    except (TypeError, ValueError):
+        return None
+    return parsed.hour * 60 + parsed.minute
+
+
+def is_locked_at(start, end, local_dt):
+    """True from start up to (not including) end, e.g. 23:00-04:00 covers 23:30 and 03:59."""
+    start_min, end_min = parse_hhmm(start), parse_hhmm(end)
+    if start_min is None or end_min is None:
+        return False
+    current = local_dt.hour * 60 + local_dt.minute
+    if start_min < end_min:
+        return start_min <= current < end_min
+    return current >= start_min or current < end_min
+
+
+def next_transition(start, end, now, offset_hours=0):
+    """Timestamp of the next start or end time after now (a timestamp), with times read in UTC+offset_hours."""
+    offset = timedelta(hours=offset_hours)
+    local = datetime.fromtimestamp(now, timezone.utc) + offset
+    midnight = local.replace(hour=0, minute=0, second=0, microsecond=0)
+    candidates = []
+    for minutes in (parse_hhmm(start), parse_hhmm(end)):
+        if minutes is None:
+            continue
+        for day in (0, 1):
+            at = midnight + timedelta(days=day, minutes=minutes)
+            if at > local:
+                candidates.append(at)
+    if not candidates:
+        return None
+    return (min(candidates) - offset).timestamp()
+
+
+class LockoutSchedule:
+    def __init__(self):
+        self._heap = []     # (timestamp, user_id); entries that don't match self._entries are stale and skipped
+        self._entries = {}  # {user_id: (start, end, offset_hours, timestamp)}
+        self._changed = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, user_id):
+        return user_id in self._entries
+
+    def set(self, user_id, start, end, offset_hours=0, now=None, immediate=True):
+        """
+        (Re)schedules a user's window. With immediate=True they come due right away, so the caller
+        puts their role in the right state now; after that pop_due() keeps them on their transitions.
+        """
+        now = time.time() if now is None else now
+        when = now if immediate else next_transition(start, end, now, offset_hours)
+        if when is None:
+            self.remove(user_id)
+            return
+        self._entries[user_id] = (start, end, offset_hours, when)
+        heapq.heappush(self._heap, (when, user_id))
+        self._wake()
+
+    def remove(self, user_id):
+        if self._entries.pop(user_id, None) is not None:
+            self._wake()
+
+    def clear(self):
+        self._heap = []
+        self._entries = {}
+        self._wake()
+
+    def next_due(self):
+        """Timestamp of the earliest transition, or None if nobody has a lockout."""
+        while self._heap:
+            when, user_id = self._heap[0]
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[3] == when:
+                return when
+            heapq.heappop(self._heap)
+        return None
+
+    def pop_due(self, now=None):
+        """Returns [(user_id, should_be_locked)] for everyone due by now and schedules their next transition."""
+        now = time.time() if now is None else now
+        due = []
+        while True:
+            when = self.next_due()
+            if when is None or when > now:
+                break
+            _, user_id = heapq.heappop(self._heap)
+            start, end, offset_hours, _ = self._entries[user_id]
+            local = datetime.fromtimestamp(now, timezone.utc) + timedelta(hours=offset_hours)
+            due.append((user_id, is_locked_at(start, end, local)))
+            self.set(user_id, start, end, offset_hours, now=now, immediate=False)
+        return due
+
+    async def wait(self):
+        """Sleeps until the next transition is due, waking early to re-plan if the schedule changes."""
+        if self._changed is None:
+            self._changed = asyncio.Event()
+        while True:
+            self._changed.clear()
+            when = self.next_due()
+            timeout = None
+            if when is not None:
+                timeout = when - time.time()
+                if timeout <= 0:
+                    return
+                timeout += WAKE_SLACK
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                return
+
+    def _wake(self):
+        if self._changed is not None:
+            self._changed.set()
@@ -0,0 +1,215 @@
+import asyncio
+import heapq
+import itertools
+import time
+
+# --- FUNCTIONS IN THIS FILE ---
+# 1. get_scheduler() - Returns this process's RestScheduler (one per bot).
+# 2. submit(factory, priority, route, key) - Shortcut for get_scheduler().submit(...).
+# 2a. format_stats() - One-line summary of this process's queue delays (also printed every STATS_LOG_INTERVAL).
+# 3. RestScheduler - Runs Discord REST calls by priority, keeps each route under its rate limit,
+#    merges repeated operations (e.g. edits of the same message) and records how long calls waited.
+# 4. RouteBucket - Token bucket for one route. Limits are fixed defaults: discord.py keeps the response
+#    headers to itself and already waits out / retries 429s, so this only smooths our own bursts.
+# ------------------------------
+
+# Priority classes (lower runs first)
+PRIORITY_MODERATION = 0  # Deleting rule-breaking messages, role changes
+PRIORITY_INTERACTIVE = 1 # Replies people are waiting for (stickies, pings)
+PRIORITY_LOG = 2         # Log channel messages
+PRIORITY_BACKGROUND = 3  # Leaderboard edits and other periodic refreshes
+PRIORITY_NAMES = {0: "moderation", 1: "interactive", 2: "log", 3: "background"}
+
+MAX_CONCURRENCY = 4      # REST calls allowed in flight at once
+DEFAULT_LIMIT = 5        # 5 calls per route...
+DEFAULT_PER = 5.0        # ...every 5 seconds (the usual message route limit)
+SLOW_QUEUE_WARNING = 5.0 # Print a warning when a call waited longer than this many seconds
+STATS_LOG_INTERVAL = 3600 # Print the delay summary at most this often (seconds), while calls are running
+
+_SCHEDULER = None
+
+
+def get_scheduler():
+    """Returns this process's scheduler, creating it the first time."""
+    global _SCHEDULER
+    if _SCHEDULER is None:
+        _SCHEDULER = RestScheduler()
+    return _SCHEDULER
+
+
+def submit(factory, priority=PRIORITY_LOG, route=None, key=None):
+    return get_scheduler().submit(factory, priority, route, key)
+
+
+def format_stats(scheduler=None):
+    stats = (scheduler or get_scheduler()).stats()
+    parts = [
+        f"{name} {d['count']} calls avg {d['avg']:.2f}s max {d['max']:.2f}s"
+        for name, d in stats["delays"].items() if d["count"]
+    ]
+    return f"REST scheduler: {', '.join(parts) or 'no calls yet'}; {stats['coalesced']} merged, {stats['queued']} queued"
+
+
+class RouteBucket:
+    def __init__(self, limit=DEFAULT_LIMIT, per=DEFAULT_PER):
+        self.limit = limit
+        self.per = per
+        self.tokens = float(limit)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.limit, self.tokens + (now - self.updated) * self.limit / self.per)
+        self.updated = now
+
+    def wait_time(self, now):
+        """Seconds until this route may be called again (0 = now)."""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) * self.per / self.limit
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+
+class _Operation:
+    __slots__ = ("factory", "priority", "route", "key", "queued_at", "future")
+
+    def __init__(self, factory, priority, route, key, future):
+        self.factory = factory
+        self.priority = priority
+        self.route = route
+        self.key = key
+        self.queued_at = time.monotonic()
+        self.future = future
+
+
+class RestScheduler:
+    def __init__(self, max_concurrency=MAX_CONCURRENCY):
+        self._queue = []            # heap of (priority, sequence, _Operation)
+        self._pending_by_key = {}   # {key: _Operation} not started yet, for merging repeats
+        self._buckets = {}          # {route: RouteBucket}
+        self._sequence = itertools.count()
+        self._slots = None
+        self._wakeup = None
+        self._dispatcher = None
+        self.max_concurrency = max_concurrency
+        # Metrics
+        self.delays = {p: {"count": 0, "total": 0.0, "max": 0.0} for p in PRIORITY_NAMES}
+        self.coalesced = 0
+        self._stats_logged = time.monotonic()
+
+    def submit(self, factory, priority=PRIORITY_LOG, route=None, key=None):
+        """
+        Queues factory() (a function returning the coroutine to run, e.g. lambda: channel.send(text)).
+        Returns a future for its result; awaiting it is optional.
+        If an operation with the same key is still waiting, it is replaced by this one and both callers get its result.
+        """
+        loop = asyncio.get_running_loop()
+        if self._dispatcher is None or self._dispatcher.done():
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+            self._wakeup = asyncio.Event()
+            self._dispatcher = loop.create_task(self._dispatch())
+
+        if key is not None and key in self._pending_by_key:
+            op = self._pending_by_key[key]
+            op.factory = factory
+            if priority < op.priority:
+                # Moving it up the queue means re-adding it; the old heap entry is skipped later
+                op.priority = priority
+                heapq.heappush(self._queue, (priority, next(self._sequence), op))
+            self.coalesced += 1
+            return op.future
+
+        op = _Operation(factory, priority, route, key, loop.create_future())
+        op.future.add_done_callback(_mark_seen)
+        if key is not None:
+            self._pending_by_key[key] = op
+        heapq.heappush(self._queue, (priority, next(self._sequence), op))
+        self._wakeup.set()
+        return op.future
+
+    def _bucket(self, route):
+        if route not in self._buckets:
+            self._buckets[route] = RouteBucket()
+        return self._buckets[route]
+
+    def _next_ready(self):
+        """Pops the highest priority operation whose route is free. Returns (op, None) or (None, seconds to wait)."""
+        now = time.monotonic()
+        soonest = None
+        for priority, _, op in sorted(self._queue):
+            if op.future.done() or priority != op.priority:
+                continue
+            wait = self._bucket(op.route).wait_time(now) if op.route is not None else 0.0
+            if wait == 0:
+                self._queue = [entry for entry in self._queue if entry[2] is not op]
+                heapq.heapify(self._queue)
+                return op, None
+            soonest = wait if soonest is None else min(soonest, wait)
+        # Nothing runnable: drop finished/stale entries so the queue doesn't grow
+        self._queue = [entry for entry in self._queue if not entry[2].future.done() and entry[0] == entry[2].priority]
+        heapq.heapify(self._queue)
+        return None, soonest
+
+    async def _dispatch(self):
+        while True:
+            op, wait = self._next_ready()
+            if op is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            if op.key is not None and self._pending_by_key.get(op.key) is op:
+                del self._pending_by_key[op.key]
+            if op.route is not None:
+                self._bucket(op.route).take(time.monotonic())
+            await self._slots.acquire()
+            asyncio.get_running_loop().create_task(self._run(op))
+
+    async def _run(self, op):
+        try:
+            self._record_delay(op)
+            result = await op.factory()
+            if not op.future.done():
+                op.future.set_result(result)
+        except Exception as e:
+            if not op.future.done():
+                op.future.set_exception(e)
+        finally:
+            self._slots.release()
+
+    def _record_delay(self, op):
+        delay = time.monotonic() - op.queued_at
+        stats = self.delays[op.priority]
+        stats["count"] += 1
+        stats["total"] += delay
+        stats["max"] = max(stats["max"], delay)
+        if delay > SLOW_QUEUE_WARNING:
+            print(f"REST scheduler: {PRIORITY_NAMES[op.priority]} call waited {delay:.1f}s (route {op.route}, {len(self._queue)} queued)")
+        if time.monotonic() - self._stats_logged > STATS_LOG_INTERVAL:
+            self._stats_logged = time.monotonic()
+            print(format_stats(self))
+
+    def stats(self):
+        """Queue delay per priority class plus the merge counter."""
+        return {
+            "queued": len(self._queue),
+            "coalesced": self.coalesced,
+            "delays": {
+                PRIORITY_NAMES[p]: {
+                    "count": d["count"],
+                    "avg": d["total"] / d["count"] if d["count"] else 0.0,
+                    "max": d["max"]
+                } for p, d in self.delays.items()
+            }
+        }
+
+
+def _mark_seen(future):
+    # Fire-and-forget calls fail quietly (like the bare try/excepts they replace) instead of
+    # asyncio warning that the exception was never retrieved
+    if not future.cancelled():
+        future.exception()
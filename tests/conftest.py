@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The shared modules live in the repo root, next to the bot folders
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
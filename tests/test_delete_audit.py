@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from delete_audit import find_deleter
+
+SEEN = datetime(2026, 1, 1, 12, 0, 0, tzinfo=timezone.utc)
+
+
+def _message(author_id=1, channel_id=10):
+    return SimpleNamespace(author=SimpleNamespace(id=author_id), channel=SimpleNamespace(id=channel_id))
+
+
+def _entry(user, target_id=1, channel_id=10, seconds=0):
+    return SimpleNamespace(
+        user=user,
+        target=SimpleNamespace(id=target_id),
+        extra=SimpleNamespace(channel=SimpleNamespace(id=channel_id)),
+        created_at=SEEN + timedelta(seconds=seconds),
+    )
+
+
+def test_matches_target_channel_and_time():
+    assert find_deleter([_entry("mod", seconds=-3)], _message(), SEEN) == "mod"
+
+
+def test_allows_clock_skew_either_way():
+    assert find_deleter([_entry("mod", seconds=5)], _message(), SEEN) == "mod"
+    assert find_deleter([_entry("mod", seconds=-19)], _message(), SEEN) == "mod"
+    assert find_deleter([_entry("mod", seconds=20)], _message(), SEEN) is None
+    assert find_deleter([_entry("mod", seconds=-25)], _message(), SEEN) is None
+
+
+def test_other_target_or_channel_does_not_match():
+    entries = [_entry("a", target_id=2), _entry("b", channel_id=11), _entry("c")]
+    assert find_deleter(entries, _message(), SEEN) == "c"
+    assert find_deleter(entries[:2], _message(), SEEN) is None
+
+
+def test_entries_without_channel_are_skipped():
+    entry = _entry("mod")
+    entry.extra = None
+    assert find_deleter([entry], _message(), SEEN) is None
@@ -0,0 +1,34 @@
+from group_ranking import GroupRanking
+
+
+def test_top_and_updates():
+    ranking = GroupRanking({"a": 5, "b": 10, "c": 1})
+    assert ranking.top(2) == [("b", 10), ("a", 5)]
+    ranking.set("c", 20)
+    ranking.remove("b")
+    ranking.remove("missing")
+    assert ranking.top() == [("c", 20), ("a", 5)]
+    assert len(ranking) == 2
+
+
+def test_ties_share_the_best_rank():
+    ranking = GroupRanking({"a": 5, "b": 5, "c": 3})
+    assert ranking.rank_for("a") == (1, 3)
+    assert ranking.rank_for("b") == (1, 3)
+    assert ranking.rank_for("c") == (3, 3)
+
+
+def test_rank_for_uses_stored_points_plus_pending():
+    ranking = GroupRanking({"a": 10, "b": 8, "c": 6})
+    assert ranking.rank_for("c") == (3, 3)
+    assert ranking.rank_for("c", pending=3) == (2, 3)
+    assert ranking.rank_for("c", pending=5) == (1, 3)
+    # Pending points can also lower a total (^remove before the next merge)
+    assert ranking.rank_for("a", pending=-3) == (2, 3)
+    assert ranking.rank_for("a", pending=-5) == (3, 3)
+
+
+def test_rank_for_unranked_user():
+    ranking = GroupRanking({"a": 10, "b": 8})
+    assert ranking.rank_for("new") == (3, 3)
+    assert ranking.rank_for("new", pending=9) == (2, 3)
@@ -0,0 +1,100 @@
+import asyncio
+import time
+
+from jail_timers import JailTimers
+
+
+def _timers():
+    released, saves = [], []
+
+    async def on_release(user_id):
+        released.append(user_id)
+        await timers.release(user_id)
+
+    async def on_change():
+        saves.append(dict(timers.timeouts))
+
+    timers = JailTimers(on_release, on_change)
+    return timers, released, saves
+
+
+def test_sentence_expires_while_in_jail():
+    timers, released, _ = _timers()
+
+    async def run():
+        await timers.jail("1", 0.05, in_jail=True)
+        assert timers.is_serving("1")
+        await asyncio.sleep(0.15)
+
+    asyncio.run(run())
+    assert released == ["1"]
+    assert "1" not in timers
+
+
+def test_time_only_counts_inside_the_vc():
+    timers, released, _ = _timers()
+
+    async def run():
+        await timers.jail("1", 0.2)
+        await asyncio.sleep(0.1) # Not in the VC yet: nothing served
+        assert timers.remaining("1") == 0.2
+        await timers.enter("1")
+        await asyncio.sleep(0.05)
+        await timers.leave("1")
+        left = timers.remaining("1")
+        await asyncio.sleep(0.1)
+        assert timers.remaining("1") == left
+        return left
+
+    left = asyncio.run(run())
+    assert 0.1 < left < 0.16
+    assert released == []
+
+
+def test_saved_deadline_counts_downtime():
+    timers, _, _ = _timers()
+
+    async def run():
+        await timers.jail("1", 100, in_jail=True)
+
+    asyncio.run(run())
+    saved = {"1": dict(timers.timeouts["1"])}
+    assert abs(saved["1"]["deadline"] - (time.time() + 100)) < 1
+
+    # The bot was down for 30 seconds while the user stayed in the VC
+    saved["1"]["deadline"] -= 30
+    restarted, released, _ = _timers()
+    restarted.load(saved)
+    assert not restarted.is_serving("1")
+
+    async def resume():
+        await restarted.sync({"1"})
+        return restarted.remaining("1")
+
+    assert 69 < asyncio.run(resume()) <= 70
+    assert released == []
+
+
+def test_past_deadline_releases_on_sync():
+    timers, released, _ = _timers()
+    timers.load({"1": {"remaining_seconds": 60, "last_check": time.time() - 90, "deadline": time.time() - 30}})
+
+    async def run():
+        await timers.sync({"1"})
+        await asyncio.sleep(0.05)
+
+    asyncio.run(run())
+    assert released == ["1"]
+
+
+def test_left_during_downtime_keeps_saved_time():
+    timers, _, saves = _timers()
+    timers.load({"1": {"remaining_seconds": 60, "last_check": time.time() - 10, "deadline": time.time() + 50}})
+
+    async def run():
+        await timers.sync(set())
+
+    asyncio.run(run())
+    assert timers.remaining("1") == 60
+    assert "deadline" not in timers.timeouts["1"]
+    assert saves
@@ -0,0 +1,226 @@
+import asyncio
+import os
+import signal
+import time
+
+import pytest
+
+from local_db import replay_ops
+
+
+def _scan_replay(data, ops):
+    """The plain one-scan-per-entry replay, kept here as the reference."""
+    for op in ops:
+        if op["op"] == "set":
+            data[op["c"]] = op["value"]
+            continue
+        collection = data.setdefault(op["c"], [])
+        if op["op"] == "put":
+            key = {k: op["doc"].get(k) for k in op.get("key", ["_id"])}
+            for i, old in enumerate(collection):
+                if all(old.get(k) == v for k, v in key.items()):
+                    collection[i] = op["doc"]
+                    break
+            else:
+                collection.append(op["doc"])
+        elif op["op"] == "del":
+            data[op["c"]] = [d for d in collection if not all(d.get(k) == v for k, v in op["match"].items())]
+
+
+def _points(n):
+    return [{"user_id": i, "guild_id": 1, "points": i} for i in range(n)]
+
+
+def test_replay_matches_scan():
+    ops = [
+        {"op": "put", "c": "user_points", "doc": {"user_id": 3, "guild_id": 1, "points": 99}, "key": ["user_id", "guild_id"]},
+        {"op": "put", "c": "user_points", "doc": {"user_id": 50, "guild_id": 1, "points": 1}, "key": ["user_id", "guild_id"]},
+        {"op": "del", "c": "user_points", "match": {"user_id": 4}},
+        {"op": "put", "c": "user_points", "doc": {"user_id": 4, "guild_id": 1, "points": 7}, "key": ["user_id", "guild_id"]},
+        {"op": "put", "c": "user_points", "doc": {"user_id": 3, "guild_id": 1, "points": 100}, "key": ["user_id", "guild_id"]},
+        {"op": "put", "c": "sticky_messages", "doc": {"_id": "a", "channel_id": 5}},
+        {"op": "del", "c": "user_points", "match": {"guild_id": 1, "points": 5}},
+        {"op": "set", "c": "jail_data", "value": {"1": {"remaining_seconds": 30}}},
+    ]
+    expected = {"user_points": _points(10)}
+    _scan_replay(expected, ops)
+    data = {"user_points": _points(10)}
+    replay_ops(data, ops)
+    assert data == expected
+
+
+def test_replay_deletes_every_match():
+    data = {"c": [{"_id": 1, "user_id": 9}, {"_id": 2, "user_id": 9}, {"_id": 3, "user_id": 8}]}
+    replay_ops(data, [{"op": "del", "c": "c", "match": {"user_id": 9}}])
+    assert data == {"c": [{"_id": 3, "user_id": 8}]}
+
+
+def test_replay_large_journal():
+    ops = []
+    for i in range(0, 60000, 120):
+        ops.append({"op": "put", "c": "user_points", "doc": {"user_id": i, "guild_id": 1, "points": -i}, "key": ["user_id", "guild_id"]})
+    for i in range(1, 60000, 600):
+        ops.append({"op": "del", "c": "user_points", "match": {"user_id": i, "guild_id": 1}})
+    for i in range(60000, 60100):
+        ops.append({"op": "put", "c": "user_points", "doc": {"user_id": i, "guild_id": 1, "points": i}, "key": ["user_id", "guild_id"]})
+
+    data = {"user_points": _points(60000)}
+    started = time.perf_counter()
+    replay_ops(data, ops)
+    elapsed = time.perf_counter() - started
+
+    deleted = set(range(1, 60000, 600))
+    expected = [{"user_id": i, "guild_id": 1, "points": -i if i < 60000 and i % 120 == 0 else i} for i in range(60100) if i not in deleted]
+    assert data == {"user_points": expected}
+    assert elapsed < 2
+
+
+def _collection(tmp_path, name="things"):
+    from local_db import LocalCollection
+    return LocalCollection(name, indexes=("user_id",), db_file=str(tmp_path / "database.json"))
+
+
+def test_collection_delete_one_removes_every_match(tmp_path):
+    col = _collection(tmp_path)
+
+    async def run():
+        await col.insert_one({"user_id": 1, "message_id": 10})
+        await col.insert_one({"user_id": 1, "message_id": 11})
+        await col.insert_one({"user_id": 2, "message_id": 12})
+        result = await col.delete_one({"user_id": 1})
+        return result.deleted_count, await col.find_all()
+
+    deleted, left = asyncio.run(run())
+    assert deleted == 2
+    assert [doc["message_id"] for doc in left] == [12]
+
+
+def test_collection_replace_one_always_inserts(tmp_path):
+    col = _collection(tmp_path)
+
+    async def run():
+        await col.insert_one({"user_id": 1, "url": "a"})
+        await col.insert_one({"user_id": 1, "url": "b"})
+        await col.replace_one({"user_id": 1}, {"user_id": 1, "url": "c"})
+        await col.replace_one({"user_id": 3}, {"user_id": 3, "url": "d"})
+        return await col.find_all()
+
+    docs = asyncio.run(run())
+    assert sorted(doc["url"] for doc in docs) == ["c", "d"]
+
+
+def test_collection_update_one_and_find(tmp_path):
+    col = _collection(tmp_path)
+
+    async def run():
+        assert not await col.update_one({"_id": "config"}, {"$set": {"log": 5}})
+        await col.update_one({"_id": "config"}, {"$set": {"log": 5}}, upsert=True)
+        await col.update_one({"_id": "config"}, {"$set": {"log": 6, "role": 7}})
+        await col.insert_one({"user_id": 4})
+        found = await col.find({"user_id": 4}).to_list()
+        return await col.find_one({"_id": "config"}), found
+
+    config, found = asyncio.run(run())
+    assert config == {"_id": "config", "log": 6, "role": 7}
+    assert len(found) == 1 and found[0]["user_id"] == 4
+
+
+def test_collection_survives_reload(tmp_path):
+    from local_db import LocalDatabase, flush_all
+    col = _collection(tmp_path)
+
+    async def run():
+        await col.insert_one({"user_id": 1, "n": 1})
+        await col.update_one({"user_id": 1}, {"$set": {"n": 2}})
+        await col.insert_one({"user_id": 2, "n": 3})
+        await col.delete_one({"user_id": 2})
+
+    asyncio.run(run())
+    flush_all()
+    reloaded = LocalDatabase(str(tmp_path / "database.json"))
+    assert [(d["user_id"], d["n"]) for d in reloaded.docs["things"].values()] == [(1, 2)]
+
+
+def _journal(tmp_path, **kwargs):
+    from local_db import Journal
+    return Journal(str(tmp_path / "database.json"), **kwargs)
+
+
+def _reload(tmp_path):
+    journal = _journal(tmp_path)
+    data = journal.read_snapshot({"things": []})
+    replay_ops(data, journal.read_ops())
+    return data
+
+
+def _put(i, value):
+    return {"op": "put", "c": "things", "doc": {"_id": i, "v": value}}
+
+
+def test_journal_round_trip(tmp_path):
+    journal = _journal(tmp_path, flush_delay=0.01)
+
+    async def run():
+        journal.append(_put(1, "a"), _put(2, "b"))
+        journal.append(_put(1, "c"), {"op": "del", "c": "things", "match": {"_id": 2}})
+        await asyncio.sleep(0.05)
+
+    asyncio.run(run())
+    journal.flush()
+    assert _reload(tmp_path) == {"things": [{"_id": 1, "v": "c"}]}
+
+
+def test_journal_compaction_keeps_later_entries(tmp_path):
+    journal = _journal(tmp_path, flush_delay=0.01)
+
+    async def run():
+        journal.append(_put(1, "a"))
+        await asyncio.sleep(0.05)
+        journal.append(_put(2, "b"))
+        journal.compact({"things": [{"_id": 1, "v": "a"}, {"_id": 2, "v": "b"}]})
+        journal.append(_put(3, "c"))
+        await asyncio.sleep(0.05)
+
+    asyncio.run(run())
+    journal.flush()
+    with open(journal.journal_path) as f:
+        assert len(f.readlines()) == 1
+    assert _reload(tmp_path) == {"things": [{"_id": 1, "v": "a"}, {"_id": 2, "v": "b"}, {"_id": 3, "v": "c"}]}
+
+
+def test_failed_compaction_keeps_pending_entries(tmp_path, monkeypatch):
+    journal = _journal(tmp_path, flush_delay=0.01)
+    real_replace = os.replace
+
+    def failing_replace(src, dst):
+        if dst == journal.file_path: raise OSError("disk full")
+        real_replace(src, dst)
+
+    async def run():
+        journal.append(_put(1, "a"))
+        await asyncio.sleep(0.05)
+        journal.append(_put(2, "b"))
+        monkeypatch.setattr(os, "replace", failing_replace)
+        journal.compact({"things": [{"_id": 1, "v": "a"}, {"_id": 2, "v": "b"}]})
+        journal.flush()
+        monkeypatch.setattr(os, "replace", real_replace)
+
+    asyncio.run(run())
+    assert journal.entries == 2
+    assert not os.path.exists(journal.file_path)
+    assert _reload(tmp_path) == {"things": [{"_id": 1, "v": "a"}, {"_id": 2, "v": "b"}]}
+
+
+def test_terminate_flushes_from_the_loop(tmp_path):
+    import local_db
+    journal = _journal(tmp_path, flush_delay=60)
+
+    async def run():
+        journal.append(_put(1, "a"))
+        with journal._lock: # A journal write in progress when the signal lands
+            local_db._on_terminate(signal.SIGTERM, None)
+        await asyncio.sleep(0.05)
+
+    with pytest.raises(SystemExit):
+        asyncio.run(run())
+    assert _reload(tmp_path) == {"things": [{"_id": 1, "v": "a"}]}
@@ -0,0 +1,67 @@
+from datetime import datetime, timezone
+
+from lockout_schedule import LockoutSchedule, is_locked_at, next_transition, parse_hhmm
+
+
+def _at(hour, minute, day=1):
+    return datetime(2024, 1, day, hour, minute, tzinfo=timezone.utc)
+
+
+def test_parse_hhmm():
+    assert parse_hhmm("00:00") == 0
+    assert parse_hhmm("23:59") == 23 * 60 + 59
+    assert parse_hhmm("24:00") is None
+    assert parse_hhmm("soon") is None
+    assert parse_hhmm(None) is None
+
+
+def test_window_includes_start_and_excludes_end():
+    assert not is_locked_at("09:00", "17:00", _at(8, 59))
+    assert is_locked_at("09:00", "17:00", _at(9, 0))
+    assert is_locked_at("09:00", "17:00", _at(16, 59))
+    assert not is_locked_at("09:00", "17:00", _at(17, 0))
+
+
+def test_window_across_midnight():
+    assert not is_locked_at("23:00", "04:00", _at(22, 59))
+    assert is_locked_at("23:00", "04:00", _at(23, 0))
+    assert is_locked_at("23:00", "04:00", _at(0, 0))
+    assert is_locked_at("23:00", "04:00", _at(3, 59))
+    assert not is_locked_at("23:00", "04:00", _at(4, 0))
+
+
+def test_invalid_window_is_never_locked():
+    assert not is_locked_at("9am", "17:00", _at(12, 0))
+
+
+def test_next_transition_is_strictly_after_now():
+    start = _at(9, 0).timestamp()
+    assert next_transition("09:00", "17:00", start) == _at(17, 0).timestamp()
+    assert next_transition("09:00", "17:00", start - 1) == start
+    # After the end, the next one is tomorrow's start
+    assert next_transition("09:00", "17:00", _at(17, 0).timestamp()) == _at(9, 0, day=2).timestamp()
+    assert next_transition("23:00", "04:00", _at(23, 30).timestamp()) == _at(4, 0, day=2).timestamp()
+
+
+def test_next_transition_reads_times_in_the_users_offset():
+    # 09:00 at UTC+2 is 07:00 UTC; 09:00 at UTC-5 is 14:00 UTC
+    assert next_transition("09:00", "17:00", _at(6, 0).timestamp(), offset_hours=2) == _at(7, 0).timestamp()
+    assert next_transition("09:00", "17:00", _at(6, 0).timestamp(), offset_hours=-5) == _at(14, 0).timestamp()
+    assert next_transition("bad", "worse", _at(6, 0).timestamp()) is None
+
+
+def test_schedule_pops_users_on_their_transitions():
+    schedule = LockoutSchedule()
+    now = _at(8, 0).timestamp()
+    schedule.set("a", "09:00", "17:00", now=now)
+    schedule.set("b", "23:00", "04:00", now=now)
+    assert schedule.pop_due(now) == [("a", False), ("b", False)]
+    assert schedule.next_due() == _at(9, 0).timestamp()
+
+    assert schedule.pop_due(_at(9, 0).timestamp()) == [("a", True)]
+    assert schedule.next_due() == _at(17, 0).timestamp()
+
+    schedule.remove("a")
+    assert schedule.next_due() == _at(23, 0).timestamp()
+    assert schedule.pop_due(_at(23, 0).timestamp()) == [("b", True)]
+    assert "a" not in schedule and len(schedule) == 1
@@ -0,0 +1,83 @@
+import asyncio
+
+from rest_scheduler import (RestScheduler, RouteBucket, PRIORITY_MODERATION, PRIORITY_INTERACTIVE,
+                            PRIORITY_BACKGROUND)
+
+
+def _call(order, name):
+    async def run():
+        order.append(name)
+        return name
+    return run
+
+
+def test_higher_priority_runs_first():
+    order = []
+
+    async def run():
+        scheduler = RestScheduler(max_concurrency=1)
+        futures = [
+            scheduler.submit(_call(order, "background"), PRIORITY_BACKGROUND),
+            scheduler.submit(_call(order, "interactive"), PRIORITY_INTERACTIVE),
+            scheduler.submit(_call(order, "moderation"), PRIORITY_MODERATION),
+        ]
+        await asyncio.gather(*futures)
+
+    asyncio.run(run())
+    assert order == ["moderation", "interactive", "background"]
+
+
+def test_same_key_is_merged_into_the_latest_call():
+    order = []
+
+    async def run():
+        scheduler = RestScheduler(max_concurrency=1)
+        first = scheduler.submit(_call(order, "edit 1"), PRIORITY_BACKGROUND, key=("edit", 1))
+        second = scheduler.submit(_call(order, "edit 2"), PRIORITY_BACKGROUND, key=("edit", 1))
+        assert first is second
+        assert await first == "edit 2"
+        return scheduler.stats()
+
+    stats = asyncio.run(run())
+    assert order == ["edit 2"]
+    assert stats["coalesced"] == 1
+
+
+def test_merging_keeps_the_higher_priority():
+    order = []
+
+    async def run():
+        scheduler = RestScheduler(max_concurrency=1)
+        futures = [
+            scheduler.submit(_call(order, "refresh"), PRIORITY_BACKGROUND, key="board"),
+            scheduler.submit(_call(order, "log"), PRIORITY_INTERACTIVE),
+            scheduler.submit(_call(order, "refresh now"), PRIORITY_MODERATION, key="board"),
+        ]
+        await asyncio.gather(*futures)
+
+    asyncio.run(run())
+    assert order == ["refresh now", "log"]
+
+
+def test_errors_reach_the_caller():
+    async def fail():
+        raise ValueError("nope")
+
+    async def run():
+        scheduler = RestScheduler()
+        try:
+            await scheduler.submit(fail, PRIORITY_INTERACTIVE)
+        except ValueError as e:
+            return str(e)
+
+    assert asyncio.run(run()) == "nope"
+
+
+def test_route_bucket_spaces_out_calls():
+    bucket = RouteBucket(limit=2, per=1.0)
+    now = bucket.updated
+    assert bucket.wait_time(now) == 0
+    bucket.take(now)
+    bucket.take(now)
+    assert bucket.wait_time(now) == 0.5
+    assert bucket.wait_time(now + 0.5) == 0